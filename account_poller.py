@@ -0,0 +1,94 @@
+import os
+import json
+import time
+import hashlib
+
+from file_lock import locked_file
+
+# === Общий опрос состояния аккаунта для всех ботов на одном API-ключе ===
+# Вместо get_positions/get_open_orders/get_tickers на каждый символ каждого
+# бота — три запроса на весь аккаунт: позиции и открытые ордера по расчётной
+# монете (settleCoin, с постраничным чтением) и тикеры всей категории.
+# Снимок лежит в <POLLER_DIR>/<hash ключа>_<category>_<coin>.json; процесс,
+# который первым пришёл за свежими данными, под файловой блокировкой
+# опрашивает биржу и сохраняет снимок, остальные в течение MAX_AGE секунд
+# берут свой символ из него. Число запросов растёт с числом аккаунтов, а не ботов.
+
+POLLER_DIR = os.environ.get("BYBIT_ACCOUNT_STATE_DIR", os.path.join("run", "account_state"))
+MAX_AGE = float(os.environ.get("BYBIT_ACCOUNT_STATE_MAX_AGE", 10))  # сек
+POSITIONS_PAGE = 200
+ORDERS_PAGE = 50
+
+
+def _float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+def _paged(method, limit, **params):
+    # Все страницы списка по nextPageCursor
+    items = []
+    cursor = None
+    while True:
+        if cursor:
+            params["cursor"] = cursor
+        result = method(limit=limit, **params).get("result", {})
+        items.extend(result.get("list", []))
+        cursor = result.get("nextPageCursor")
+        if not cursor:
+            return items
+
+
+class AccountPoller:
+    def __init__(self, api_key, category="linear", settle_coin="USDT", max_age=MAX_AGE):
+        os.makedirs(POLLER_DIR, exist_ok=True)
+        key_id = hashlib.sha256((api_key or "").encode()).hexdigest()[:16]
+        self.path = os.path.join(POLLER_DIR, f"{key_id}_{category}_{settle_coin}.json")
+        self.category = category
+        self.settle_coin = settle_coin
+        self.max_age = max_age
+
+    def _fetch(self, session):
+        positions = {}
+        for pos in _paged(session.get_positions, POSITIONS_PAGE, category=self.category, settleCoin=self.settle_coin):
+            # Как раньше: по символу берём первую позицию
+            positions.setdefault(pos["symbol"], {
+                "size": _float(pos.get("size")),
+                "avg_price": _float(pos.get("avgPrice")),
+                "side": pos.get("side", ""),
+            })
+        orders = {}
+        for order in _paged(session.get_open_orders, ORDERS_PAGE, category=self.category, settleCoin=self.settle_coin):
+            orders.setdefault(order["symbol"], []).append(
+                [order["orderId"], _float(order.get("price")), _float(order.get("qty"))])
+        tickers = session.get_tickers(category=self.category).get("result", {}).get("list", [])
+        mark_prices = {t["symbol"]: _float(t.get("markPrice")) for t in tickers}
+        return {"ts": time.time(), "positions": positions, "orders": orders, "mark_prices": mark_prices}
+
+    def snapshot(self, session, max_age=None):
+        # Снимок не старше max_age сек: из файла или одним опросом на весь аккаунт
+        max_age = self.max_age if max_age is None else max_age
+        with locked_file(self.path + ".lock"):
+            if os.path.exists(self.path):
+                with open(self.path) as f:
+                    saved = json.load(f)
+                if time.time() - saved["ts"] < max_age:
+                    return saved
+            saved = self._fetch(session)
+            tmp_file = self.path + ".tmp"
+            with open(tmp_file, "w") as f:
+                json.dump(saved, f)
+            os.replace(tmp_file, self.path)
+            return saved
+
+    def position(self, session, symbol, max_age=None):
+        # Позиция символа в формате записи позиций (с mark_price)
+        saved = self.snapshot(session, max_age)
+        pos = dict(saved["positions"].get(symbol, {"size": 0.0, "avg_price": 0.0, "side": ""}))
+        pos["mark_price"] = saved["mark_prices"].get(symbol, 0.0)
+        return pos
+
+    def orders(self, session, symbol, max_age=None):
+        # [(orderId, price, qty)] открытых ордеров символа
+        return [tuple(order) for order in self.snapshot(session, max_age)["orders"].get(symbol, [])]
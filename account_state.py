@@ -2,6 +2,8 @@ import os
 import json
 from datetime import datetime
 
+from read_cache import cached_read
+
 def load_account_state(account_path):
     path = os.path.join(account_path, "account_state.json")
     if not os.path.exists(path):
@@ -17,13 +19,22 @@ def load_account_state(account_path):
     with open(path, "r") as f:
         return json.load(f)
 
+def _read_json(path):
+    with open(path, "r") as f:
+        return json.load(f)
+
 def save_account_state(account_path, state):
+    # Атомарно: читатели (и кэш по версии файла) не видят недописанный файл
     path = os.path.join(account_path, "account_state.json")
-    with open(path, "w") as f:
+    tmp_file = path + ".tmp"
+    with open(tmp_file, "w") as f:
         json.dump(state, f, indent=2)
+    os.replace(tmp_file, path)
 
 def check_entry_allowed(account_path):
-    state = load_account_state(account_path)
+    # Проверяется каждую минуту — файл разбираем, только если он изменился
+    path = os.path.join(account_path, "account_state.json")
+    state = cached_read(path, _read_json) if os.path.exists(path) else load_account_state(account_path)
     return state.get("user_balance", 0.0) >= 0
 
 def update_after_position_close(account_path, current_balance):
@@ -0,0 +1,140 @@
+import os
+import threading
+
+from kline_stream import PublicWebSocket, PUBLIC_WS_URL
+from execution_journal import position_record
+
+# === Позиция и ордера символа из приватных потоков WebSocket Bybit ===
+# Приватное соединение подписано на position, order и execution, публичное —
+# на tickers.<symbol> (mark price). Колбэки pybit работают в потоках
+# веб-сокетов и обновляют общее состояние под замком; запись позиций ждёт
+# события changed и сохраняет только изменения — без опроса REST раз в минуту.
+# Потоки присылают только изменения, поэтому начальное состояние (и сверка
+# после возможных пропусков при переподключении) — снимок REST через reset().
+# BYBIT_WS_PRIVATE_URL / BYBIT_WS_PUBLIC_URL направляют потоки на локальный
+# фейковый сервер (tests/fake_bybit_ws.py, проверка — tests/test_account_stream.py).
+
+PRIVATE_WS_URL = os.environ.get("BYBIT_WS_PRIVATE_URL")
+# Как в get_open_orders по REST: обычные активные ордера, без условных
+OPEN_ORDER_STATUSES = {"New", "PartiallyFilled"}
+
+
+class PrivateWebSocket(PublicWebSocket):
+    # Тот же перехват адреса, что и у публичного потока
+    pass
+
+
+def _float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class PositionState:
+    def __init__(self, symbol):
+        self.symbol = symbol
+        self.lock = threading.Lock()
+        self.changed = threading.Event()
+        self.position = {"size": 0.0, "avg_price": 0.0, "side": ""}
+        self.orders = {}  # orderId → (price, qty)
+        self.mark_price = 0.0
+        self.fills = 0
+
+    def reset(self, position, orders, mark_price):
+        # Снимок REST: position как в get_position, orders — [(orderId, price, qty)]
+        with self.lock:
+            self.position = {k: position[k] for k in ("size", "avg_price", "side")}
+            self.orders = {order_id: (price, qty) for order_id, price, qty in orders}
+            self.mark_price = mark_price
+        self.changed.set()
+
+    def _own(self, message):
+        return [item for item in message.get("data", []) if item.get("symbol") == self.symbol]
+
+    def on_position(self, message):
+        items = self._own(message)
+        if not items:
+            return
+        item = items[-1]
+        size = _float(item.get("size"))
+        with self.lock:
+            self.position = {
+                "size": size,
+                "avg_price": _float(item.get("avgPrice")) if size else 0.0,
+                "side": item.get("side", "") if item.get("side") != "None" else "",
+            }
+            if item.get("markPrice"):
+                self.mark_price = _float(item["markPrice"])
+        self.changed.set()
+
+    def on_order(self, message):
+        items = self._own(message)
+        if not items:
+            return
+        with self.lock:
+            for item in items:
+                if item.get("stopOrderType"):
+                    continue
+                if item.get("orderStatus") in OPEN_ORDER_STATUSES:
+                    self.orders[item["orderId"]] = (_float(item.get("price")), _float(item.get("qty")))
+                else:
+                    self.orders.pop(item["orderId"], None)
+        self.changed.set()
+
+    def on_execution(self, message):
+        # Сделки меняют позицию — её пришлёт поток position; здесь только счёт
+        # исполнений и пробуждение записи
+        items = self._own(message)
+        if not items:
+            return
+        with self.lock:
+            self.fills += len(items)
+        self.changed.set()
+
+    def on_ticker(self, message):
+        # pybit собирает дельты тикера в полный снимок
+        mark_price = message.get("data", {}).get("markPrice")
+        if mark_price:
+            with self.lock:
+                self.mark_price = _float(mark_price)
+
+    def snapshot(self):
+        # Поля записи журнала позиций (без ts)
+        with self.lock:
+            return position_record({**self.position, "mark_price": self.mark_price}, list(self.orders.values()))
+
+    def wait(self, timeout):
+        # True — если позиция или ордера менялись с прошлого вызова
+        changed = self.changed.wait(timeout)
+        self.changed.clear()
+        return changed
+
+
+class AccountStream:
+    def __init__(self, symbol, category, api_key, api_secret,
+                 private_url=PRIVATE_WS_URL, public_url=PUBLIC_WS_URL):
+        self.symbol = symbol
+        self.category = category
+        self.api_key = api_key
+        self.api_secret = api_secret
+        self.private_url = private_url
+        self.public_url = public_url
+        self.state = PositionState(symbol)
+        self.private = self.public = None
+
+    def start(self):
+        # retries=0 — pybit переподключается бесконечно, подписки (и авторизацию) восстанавливает сам
+        self.private = PrivateWebSocket(channel_type="private", url=self.private_url, testnet=False, retries=0,
+                                        api_key=self.api_key, api_secret=self.api_secret)
+        self.private.position_stream(self.state.on_position)
+        self.private.order_stream(self.state.on_order)
+        self.private.execution_stream(self.state.on_execution)
+        self.public = PublicWebSocket(channel_type=self.category, url=self.public_url, testnet=False, retries=0)
+        self.public.ticker_stream(symbol=self.symbol, callback=self.state.on_ticker)
+        print(f"🔌 WebSocket position/order/execution + tickers.{self.symbol} подключены ({self.private.endpoint})")
+
+    def stop(self):
+        for ws in (self.private, self.public):
+            if ws is not None:
+                ws.exit()
@@ -0,0 +1,202 @@
+import os
+import json
+import time
+import queue
+import argparse
+import threading
+import pandas as pd
+from datetime import datetime, timedelta, timezone
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from candle_store import append_candles, market_store_path
+from candle_resampler import BarAggregator
+from candle_gaps import record_candles, uncovered_ranges
+from bybit_client import ExchangeClient
+
+# === Параллельная догрузка истории 1min свечей ===
+# Диапазон режется на непересекающиеся окна по 1000 минут (максимум get_kline)
+# на общей сетке от эпохи (window_floor), окна качаются пулом потоков под общим
+# лимитом запросов, а страницы сразу уходят в партиционированное хранилище через
+# один поток-писатель.
+# Что качать, решает покрытие хранилища по индексу дыр (candle_gaps.py): окна,
+# все минуты которых уже есть, пропускаются. Окна, которые биржа отдала не
+# целиком (до листинга символа, простои), отмечаются в <store>/.backfill.json,
+# чтобы не запрашивать их заново. Сетка не зависит от момента запуска, поэтому
+# прерванную загрузку можно перезапустить когда угодно — скачаны будут только
+# недостающие окна.
+
+WINDOW_MINUTES = 1000
+PROGRESS_FILE = ".backfill.json"
+MAX_RETRIES = 5
+
+
+class RateLimiter:
+    # Общий бюджет запросов для всех потоков: не чаще rate запросов в секунду
+    def __init__(self, rate):
+        self.interval = 1.0 / rate
+        self.lock = threading.Lock()
+        self.next_time = 0.0
+
+    def acquire(self):
+        with self.lock:
+            now = time.monotonic()
+            wait = self.next_time - now
+            self.next_time = max(now, self.next_time) + self.interval
+        if wait > 0:
+            time.sleep(wait)
+
+
+_local = threading.local()
+
+def _session():
+    # Один клиент на поток — соединение переиспользуется между окнами;
+    # повторы делает fetch_window, чтобы каждый запрос проходил через лимитер
+    if not hasattr(_local, "session"):
+        _local.session = ExchangeClient(retries=0)
+    return _local.session
+
+def parse_kline_list(data):
+    if not data:
+        return pd.DataFrame()
+    df = pd.DataFrame(data, columns=["timestamp", "open", "high", "low", "close", "volume", "turnover"])
+    df["ts"] = pd.to_datetime(df["timestamp"].astype("int64"), unit="ms", utc=True)
+    df = df.set_index("ts")[["open", "high", "low", "close", "volume"]].astype(float)
+    return df.sort_index()
+
+def fetch_window(symbol, category, window_start, limiter):
+    start_ms = int(window_start.timestamp() * 1000)
+    end_ms = start_ms + (WINDOW_MINUTES - 1) * 60_000
+    for attempt in range(MAX_RETRIES):
+        limiter.acquire()
+        try:
+            response = _session().get_kline(
+                category=category, symbol=symbol, interval="1",
+                start=start_ms, end=end_ms, limit=WINDOW_MINUTES,
+            )
+            if response.get("retCode") == 0:
+                return parse_kline_list(response.get("result", {}).get("list", []))
+            print(f"⚠️ Ошибка от API для окна {window_start}: {response.get('retMsg')}")
+        except Exception as e:
+            print(f"⚠️ Ошибка запроса окна {window_start}: {e}")
+        time.sleep(min(2 ** attempt, 30))
+    raise RuntimeError(f"Окно {window_start} не скачано после {MAX_RETRIES} попыток")
+
+def _load_progress(store_path):
+    path = os.path.join(store_path, PROGRESS_FILE)
+    if not os.path.exists(path):
+        return set()
+    with open(path) as f:
+        return set(json.load(f).get("done", []))
+
+def _save_progress(store_path, done):
+    path = os.path.join(store_path, PROGRESS_FILE)
+    tmp_file = path + ".tmp"
+    with open(tmp_file, "w") as f:
+        json.dump({"done": sorted(done)}, f)
+    os.replace(tmp_file, path)
+
+def window_floor(ts):
+    # Начало окна сетки, в которое попадает ts
+    ts = pd.Timestamp(ts).floor("min")
+    return ts - timedelta(minutes=int(ts.timestamp() // 60) % WINDOW_MINUTES)
+
+def _overlaps(window, ranges):
+    window_end = window + timedelta(minutes=WINDOW_MINUTES - 1)
+    return any(s <= window_end and e >= window for s, e in ranges)
+
+def backfill_candles(store_path, symbol, category, start, end, workers=4, rate=10):
+    start = window_floor(start)
+    end = pd.Timestamp(end).floor("min")
+    os.makedirs(store_path, exist_ok=True)
+
+    windows = []
+    window_start = start
+    while window_start < end:
+        windows.append(window_start)
+        window_start += timedelta(minutes=WINDOW_MINUTES)
+
+    missing = uncovered_ranges(store_path, start, end - timedelta(minutes=1)) if end > start else []
+    done = _load_progress(store_path)
+    todo = [w for w in windows if int(w.timestamp()) not in done and _overlaps(w, missing)]
+    print(f"📥 Backfill {symbol}: {start} → {end} | окон {len(windows)}, осталось {len(todo)} | "
+          f"потоков {workers}, лимит {rate} запр/сек")
+    if not todo:
+        return 0
+
+    # Писатель один — партиции дней не пишутся параллельно
+    pages = queue.Queue(maxsize=workers * 2)
+    stats = {"rows": 0, "windows": 0}
+
+    def writer():
+        while True:
+            item = pages.get()
+            if item is None:
+                break
+            window, df = item
+            try:
+                append_candles(store_path, df)
+                record_candles(store_path, df.index)
+            except Exception as e:
+                print(f"❌ Ошибка записи окна {window}: {e}")
+                continue
+            # Окно, которое ещё не закончилось, не отмечаем — его докачает следующий запуск
+            if window + timedelta(minutes=WINDOW_MINUTES) <= end:
+                done.add(int(window.timestamp()))
+                _save_progress(store_path, done)
+            stats["rows"] += len(df)
+            stats["windows"] += 1
+            if stats["windows"] % 50 == 0:
+                print(f"📈 Записано окон {stats['windows']}/{len(todo)}, свечей {stats['rows']}")
+
+    writer_thread = threading.Thread(target=writer, daemon=True)
+    writer_thread.start()
+
+    limiter = RateLimiter(rate)
+    failed = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(fetch_window, symbol, category, w, limiter): w for w in todo}
+        for future in as_completed(futures):
+            window = futures.pop(future)
+            try:
+                pages.put((window, future.result()))
+            except Exception as e:
+                failed += 1
+                print(f"❌ {e}")
+
+    pages.put(None)
+    writer_thread.join()
+    print(f"✅ Backfill {symbol} завершён: свечей {stats['rows']}, окон {stats['windows']}, ошибок {failed}")
+    return stats["rows"]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Параллельная догрузка 1min истории в хранилище свечей")
+    parser.add_argument("--bot", help="Имя стратегии — символ берётся из configs/<bot>.json")
+    parser.add_argument("--symbol", help="Символ, если --bot не указан")
+    parser.add_argument("--category", default="linear")
+    parser.add_argument("--days", type=int, default=365, help="Глубина истории в днях")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--rps", type=float, default=10, help="Общий лимит запросов в секунду")
+    args = parser.parse_args()
+
+    if args.bot:
+        with open(os.path.join("configs", f"{args.bot}.json")) as f:
+            config = json.load(f)
+        symbol = config.get("symbol", "BTCUSDT").upper()
+        category = config.get("category", "linear")
+    elif args.symbol:
+        symbol = args.symbol.upper()
+        category = args.category
+    else:
+        parser.error("нужен --bot или --symbol")
+    store_1min = market_store_path(symbol, category, "1min")
+
+    end = datetime.now(timezone.utc).replace(second=0, microsecond=0)
+    start = end - timedelta(days=args.days)
+    started = time.time()
+    backfill_candles(store_1min, symbol, category, start, end, workers=args.workers, rate=args.rps)
+
+    # Старшие таймфреймы пересобираем только на догруженном диапазоне
+    for rule in ["5min", "30min", "1h"]:
+        BarAggregator(store_1min, market_store_path(symbol, category, rule), rule).rebuild_range(window_floor(start), end)
+    print(f"⏱️ Готово за {time.time() - started:.1f} сек")
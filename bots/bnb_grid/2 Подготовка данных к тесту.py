@@ -1,10 +1,17 @@
 import os
 import json
-import time
+import sys
 import pandas as pd
-from datetime import datetime, timedelta
-from ta.momentum import RSIIndicator
-from ta.trend import CCIIndicator
+from datetime import datetime
+
+# Добавляем путь к корню проекта, чтобы видеть candle_store.py
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from candle_store import market_store_path, last_candle_ts
+from indicator_engine import TimeframeIndicators
+from feature_spec import load_feature_spec, base_timeframe, group_by_timeframe, build_features
+from commit_events import CommitCounter, candle_commit_path
+from feature_store import has_features, append_features, read_features, legacy_features_files, retire_legacy_features
+from feature_rebuild import rebuild_features, recompute_features, warmup_span
 
 # === Загрузка конфигурации ===
 def load_config():
@@ -24,97 +31,113 @@ os.makedirs(DATA_PATH, exist_ok=True)
 
 
 SYMBOL = config.get("symbol", "BTCUSDT").upper()
-symbol_lower = SYMBOL.lower()
+CATEGORY = config.get("category", "linear")
 
-FEATURES_PATH = os.path.join(DATA_PATH, "features.parquet")
-PARQUET_5M = os.path.join(DATA_PATH, f"{symbol_lower}_5min.parquet")
-PARQUET_30M = os.path.join(DATA_PATH, f"{symbol_lower}_30min.parquet")
-PARQUET_1H = os.path.join(DATA_PATH, f"{symbol_lower}_1h.parquet")
+# Свечи общие для символа (пишет один сборщик), признаки — свои у каждой стратегии
+FEATURES_PATH = os.path.join(DATA_PATH, "features")
+LEGACY_FEATURES_FILE = os.path.join(DATA_PATH, "features.parquet")
 
-# === Параметры ===
+# === Параметры: признаки и пороги — из "features" в configs/<bot>.json ===
 params = json.loads(os.environ.get("BOT_PARAMS", "{}"))
-RSI5_WINDOW = params.get("rsi5_window", 14)
-RSI30_WINDOW = params.get("rsi30_window", 30)
-CCI_WINDOW = params.get("cci_window", 20)
-RSI5_THRESHOLD = params.get("rsi5_threshold", 44)
-RSI30_THRESHOLD = params.get("rsi30_threshold", 55)
-CCI_THRESHOLD = params.get("cci_threshold", 100)
+FEATURE_SPEC = load_feature_spec(config, params)
+BASE_TIMEFRAME = base_timeframe(FEATURE_SPEC)
 FULL_REBUILD = params.get("full_rebuild", False)
-
-# === Загрузка parquet с колонкой ts
-def load_data_from_parquet(file_path: str, limit: int = None):
-    if not os.path.exists(file_path):
-        print(f"⚠️ Файл не найден: {file_path}")
-        return pd.DataFrame()
-    df = pd.read_parquet(file_path)
-    df["ts"] = pd.to_datetime(df["ts"], utc=True)
-    df.sort_values("ts", inplace=True)
-    return df.tail(limit) if limit else df
-
-# === Расчёт индикаторов
-def calculate_features(df_5m, df_30m, df_1h):
-    df_5m["rsi_5"] = RSIIndicator(df_5m["close"], window=RSI5_WINDOW).rsi()
-    df_30m["rsi_30"] = RSIIndicator(df_30m["close"], window=RSI30_WINDOW).rsi()
-    df_1h["cci_1h"] = CCIIndicator(df_1h["high"], df_1h["low"], df_1h["close"], window=CCI_WINDOW).cci()
-
-    df = df_5m.copy()
-    df["rsi_30"] = df_30m.set_index("ts")["rsi_30"].reindex(df["ts"], method="ffill").values
-    df["cci_1h"] = df_1h.set_index("ts")["cci_1h"].reindex(df["ts"], method="ffill").values
-
-    df["signal"] = (
-        (df["rsi_5"] < RSI5_THRESHOLD) &
-        (df["rsi_30"] < RSI30_THRESHOLD) &
-        (df["cci_1h"] < CCI_THRESHOLD)
-    ).astype(int)
-
-    df["entry_trigger"] = (df["signal"].shift(1) == 0) & (df["signal"] == 1)
-    df["entry_trigger"] = df["entry_trigger"].fillna(False)
-
-    df = df[df[["rsi_5", "rsi_30", "cci_1h"]].notna().all(axis=1)]
+COMMIT_TIMEOUT = 90  # сек без новых свечей — пересчитываем по таймеру
+
+# === Инкрементальные индикаторы: по одному движку на таймфрейм,
+# состояние в strategy_data/<bot>/indicators/
+INDICATORS_PATH = os.path.join(DATA_PATH, "indicators")
+STORES = {timeframe: market_store_path(SYMBOL, CATEGORY, timeframe) for timeframe in group_by_timeframe(FEATURE_SPEC)}
+ENGINES = {
+    timeframe: TimeframeIndicators(STORES[timeframe], specs, INDICATORS_PATH)
+    for timeframe, specs in group_by_timeframe(FEATURE_SPEC).items()
+}
+
+# === Расчёт индикаторов: новые бары от последнего учтённого
+def calculate_features():
+    frames = {}
+    for timeframe, engine in ENGINES.items():
+        frames[timeframe] = engine.update()
+        if frames[timeframe].empty:
+            return pd.DataFrame()
+
+    df = frames[BASE_TIMEFRAME].reset_index()
+    prev_signal = None
+    if has_features(FEATURES_PATH):
+        # Первая строка — последний закрытый бар, он уже записан окончательно:
+        # берём из признаков его signal для entry_trigger следующей строки.
+        # Старшие таймфреймы видны строкам только закрытыми барами, поэтому
+        # ранее записанные строки пересчитывать не нужно
+        written = read_features(FEATURES_PATH, start=df["ts"].iloc[0])
+        written = written[written["ts"] == df["ts"].iloc[0]]
+        if not written.empty:
+            prev_signal = written["signal"].iloc[0]
+        df = df.iloc[1:]
+
+    df = build_features(df, frames, FEATURE_SPEC, prev_signal)
     return df
 
+# === Полный пересчёт: состояние движков по хвосту истории, затем участки
+# истории параллельно в пуле процессов. Состояние — до пересчёта: свечи,
+# пришедшие за время пересчёта, следующий инкрементальный шаг допишет заново
+def rebuild_all_features():
+    for timeframe, engine in ENGINES.items():
+        last_ts = last_candle_ts(STORES[timeframe])
+        if last_ts is not None:
+            engine.seed(last_ts - warmup_span(FEATURE_SPEC))
+    rows = rebuild_features(FEATURES_PATH, STORES, FEATURE_SPEC)
+    if not rows:
+        print("⚠️ Нет признаков после расчёта индикаторов.")
+    return rows
+
+# === Починка истории: сборщик или backfill.py переписали уже учтённые бары
+# (candle_store.rewritten_since) — состояние движков заново по хвосту, строки
+# признаков с самого раннего переписанного бара пересчитываются поверх старых
+def repair_rewritten_history():
+    starts = {timeframe: engine.pending_rewrite() for timeframe, engine in ENGINES.items()}
+    starts = {timeframe: start for timeframe, start in starts.items() if start is not None}
+    if not starts:
+        return
+    if any(start <= ENGINES[timeframe].first_ts for timeframe, start in starts.items()):
+        rebuild_all_features()
+        return
+    start = min(starts.values()).floor(BASE_TIMEFRAME)
+    print(f"🩹 Свечи переписаны с {start} — пересчёт признаков с этого момента")
+    for timeframe, engine in ENGINES.items():
+        last_ts = last_candle_ts(STORES[timeframe])
+        if last_ts is not None:
+            engine.seed(last_ts - warmup_span(FEATURE_SPEC))
+    recompute_features(FEATURES_PATH, STORES, FEATURE_SPEC, start)
+
 # === Формирование признаков
 def prepare_features(full: bool = False):
-    df_5m = load_data_from_parquet(PARQUET_5M, limit=None if full else 1000)
-    df_30m = load_data_from_parquet(PARQUET_30M, limit=None if full else 500)
-    df_1h = load_data_from_parquet(PARQUET_1H, limit=None if full else 500)
-
-    if df_5m.empty or df_30m.empty or df_1h.empty:
-        print("🚫 Недостаточно данных для расчёта.")
+    # Пустое хранилище и признаки старого features.parquet тоже заменяем полным пересчётом
+    if full or not has_features(FEATURES_PATH) or legacy_features_files(LEGACY_FEATURES_FILE):
+        if rebuild_all_features():
+            retire_legacy_features(LEGACY_FEATURES_FILE)
         return
 
-    df = calculate_features(df_5m, df_30m, df_1h)
+    # Пишем только новые строки (после пересчёта переписанной истории)
+    repair_rewritten_history()
+    df = calculate_features()
     if df.empty:
         print("⚠️ Нет признаков после расчёта индикаторов.")
         return
+    append_features(FEATURES_PATH, df)
+    print(f"✅ Признаки сохранены: {len(df)} строк в {FEATURES_PATH}")
 
-    if os.path.exists(FEATURES_PATH) and not full:
-        df_old = pd.read_parquet(FEATURES_PATH)
-        df_old["ts"] = pd.to_datetime(df_old["ts"], utc=True)
-        df_combined = pd.concat([df_old, df])
-        df_combined = df_combined.drop_duplicates(subset="ts", keep="last").sort_values("ts")
-    else:
-        df_combined = df
-
-    df_combined["ts"] = pd.to_datetime(df_combined["ts"], utc=True)
-    df_combined.to_parquet(FEATURES_PATH, index=False)
-    print(f"✅ Признаки сохранены: {len(df_combined)} строк в {FEATURES_PATH}")
-
-# === Цикл обновления
-def wait_until_next_minute_with_buffer(buffer_sec=5):
-    now = datetime.utcnow()
-    next_minute = (now + timedelta(minutes=1)).replace(second=0, microsecond=0)
-    time.sleep((next_minute + timedelta(seconds=buffer_sec) - now).total_seconds())
-
-def auto_update_loop(buffer_sec=5):
-    print(f"🚀 Старт автообновления признаков (с буфером {buffer_sec} сек)...\n")
+# === Цикл обновления: пересчёт сразу после записи новой свечи сборщиком
+def auto_update_loop():
+    candles = CommitCounter(candle_commit_path(market_store_path(SYMBOL, CATEGORY, "1min")))
+    print(f"🚀 Старт автообновления признаков по новым свечам {SYMBOL}...\n")
     while True:
         try:
             print(f"\n⏱️ Обновление признаков: {datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')} UTC")
             prepare_features(full=FULL_REBUILD)
         except Exception as e:
             print(f"❌ Ошибка: {e}")
-        wait_until_next_minute_with_buffer(buffer_sec=buffer_sec)
+        if not candles.wait(COMMIT_TIMEOUT):
+            print(f"⚠️ {COMMIT_TIMEOUT} сек без новых свечей от сборщика — пересчёт по таймеру")
 
 if __name__ == "__main__":
-    auto_update_loop(buffer_sec=5)
+    auto_update_loop()
@@ -1,9 +1,17 @@
 import os
+import sys
 import json
 import time
-import pandas as pd
+import argparse
 from datetime import datetime, timedelta
-from pybit.unified_trading import HTTP
+
+# Добавляем путь к корню проекта, чтобы видеть bybit_client.py
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from bybit_client import get_client
+from execution_journal import (append_execution, migrate_executions_file, upgrade_executions,
+                               position_record, ChangeRecorder)
+from account_stream import AccountStream
+from account_poller import AccountPoller
 
 # === Константы ===
 CONFIG_FILE = os.path.join("configs", "bnb_grid.json")
@@ -20,7 +28,9 @@ LOG_PATH = os.path.join(ACCOUNT_PATH, "logs")
 os.makedirs(DATA_PATH, exist_ok=True)
 os.makedirs(LOG_PATH, exist_ok=True)
 
-EXECUTIONS_FILE = os.path.join(DATA_PATH, "executions.parquet")
+EXECUTIONS_PATH = os.path.join(DATA_PATH, "executions")
+migrate_executions_file(os.path.join(DATA_PATH, "executions.parquet"), EXECUTIONS_PATH)
+upgrade_executions(EXECUTIONS_PATH)
 LOG_FILE = os.path.join(LOG_PATH, "3_Запись_позиций.py.log")
 
 # === Загрузка конфигурации ===
@@ -30,6 +40,22 @@ with open(CONFIG_FILE) as f:
 SYMBOL = config["symbol"].upper()
 CATEGORY = config.get("category", "linear")
 
+parser = argparse.ArgumentParser()
+parser.add_argument("--mode", choices=["rest", "ws"], help="rest — опрос каждые SAMPLE_INTERVAL сек, ws — приватные потоки WebSocket")
+args = parser.parse_args()
+MODE = args.mode or config.get("recorder_mode", "rest")
+RESYNC_INTERVAL = 300  # сек между сверками состояния потока со снимком REST
+# Опрос каждые SAMPLE_INTERVAL сек, запись — только при изменении позиции или
+# набора ордеров, плюс heartbeat раз в HEARTBEAT_INTERVAL сек (свежий mark price)
+SAMPLE_INTERVAL = config.get("sample_interval", 5)
+HEARTBEAT_INTERVAL = config.get("heartbeat_interval", 300)
+
+# Позиции, ордера и тикеры — общим опросом на весь аккаунт (account_poller.py)
+# Снимок не старше половины периода опроса: каждый опрос видит новые данные,
+# а снимок, который только что обновил другой бот аккаунта, переиспользуется
+POLLER = AccountPoller(os.environ.get("BYBIT_API_KEY"), CATEGORY, config.get("settle_coin", "USDT"),
+                       max_age=SAMPLE_INTERVAL / 2)
+
 # === Вспомогательные функции ===
 def safe_float(value):
     try:
@@ -45,100 +71,105 @@ def log_message(message):
 def load_keys():
     return os.environ.get("BYBIT_API_KEY"), os.environ.get("BYBIT_API_SECRET")
 
-def get_position(session):
-    try:
-        result = session.get_positions(category=CATEGORY, symbol=SYMBOL)
-        positions = result.get("result", {}).get("list", [])
-        pos_data = {"size": 0.0, "avg_price": 0.0, "side": "", "mark_price": 0.0}
-        for pos in positions:
-            pos_data["size"] = safe_float(pos.get("size"))
-            pos_data["avg_price"] = safe_float(pos.get("avgPrice"))
-            pos_data["side"] = pos.get("side", "")
-            break  # берём только первую позицию
+def fetch_position(session, max_age=None):
+    # Из общего снимка аккаунта: один опрос на все боты ключа
+    return POLLER.position(session, SYMBOL, max_age)
 
-        # берём mark_price напрямую из get_tickers
-        ticker = session.get_tickers(category=CATEGORY, symbol=SYMBOL)
-        pos_data["mark_price"] = safe_float(ticker["result"]["list"][0]["markPrice"])
+def fetch_orders(session):
+    # [(orderId, price, qty)] открытых ордеров символа — из того же снимка
+    return POLLER.orders(session, SYMBOL)
 
-        return pos_data
+def save_record(ts, record):
+    # Одна запись — один новый сегмент журнала, история не перечитывается
+    append_execution(EXECUTIONS_PATH, {"ts": ts, **record})
 
-    except Exception as e:
-        log_message(f"❌ Ошибка при получении позиции: {e}")
-        return {"size": 0.0, "avg_price": 0.0, "side": "", "mark_price": 0.0}
+    log_message(f"[{ts}] ✅ Обновлено\n"
+                f"  position_size = {record['position_size']}\n"
+                f"  avg_price     = {record['avg_price']}\n"
+                f"  side          = {record['side']}\n"
+                f"  mark_price    = {record['mark_price']}\n"
+                f"  position_open = {record['position_open']}\n"
+                f"  order_count   = {record['order_count']}\n"
+                f"  order_prices  = {record['order_prices']}\n"
+                f"  order_sizes   = {record['order_sizes']}")
+
+def sample_state(session):
+    # Ошибка опроса — исключение, а не нули: записываются только изменения,
+    # и пустая позиция из-за сбоя выглядела бы как закрытие
+    pos = fetch_position(session)
+    orders = fetch_orders(session)
+
+    if pos["size"] == 0.0 and orders:
+        log_message("⚠️ Подозрение на сбой данных — пробуем переподключиться через 2 сек...")
+        time.sleep(2)
+        pos = fetch_position(session, max_age=0)  # свежий опрос, мимо общего снимка
+        orders = fetch_orders(session)
+
+    return position_record(pos, [(price, qty) for _, price, qty in orders])
 
-def get_open_orders(session):
+def resync_stream(stream, session):
+    # Снимок REST в состояние потока; при ошибке оставляем состояние потока.
+    # Только свежий опрос: общий снимок может быть старше событий потока
     try:
-        result = session.get_open_orders(category=CATEGORY, symbol=SYMBOL)
-        orders = result.get("result", {}).get("list", [])
-        prices = [safe_float(o["price"]) for o in orders]
-        sizes = [safe_float(o["qty"]) for o in orders]
-        return prices, sizes, len(orders)
+        pos = fetch_position(session, max_age=0)
+        orders = fetch_orders(session)
     except Exception as e:
-        log_message(f"❌ Ошибка при получении ордеров: {e}")
-        return [], [], 0
-
-def update_executions_table(ts: datetime, session):
-    pos = get_position(session)
-    prices, sizes, order_count = get_open_orders(session)
-
-    if pos["size"] == 0.0 and order_count > 0:
-        log_message("⚠️ Подозрение на сбой данных — пробуем переподключиться через 2 сек...")
-        time.sleep(2)
-        pos = get_position(session)
-        prices, sizes, order_count = get_open_orders(session)
-
-    record = {
-        "ts": ts,
-        "position_size": pos["size"],
-        "avg_price": pos["avg_price"],
-        "side": pos["side"],
-        "mark_price": pos["mark_price"],
-        "position_open": pos["size"] > 0,
-        "order_count": order_count,
-        "order_prices": json.dumps(prices),
-        "order_sizes": json.dumps(sizes)
-    }
-
-    df_new = pd.DataFrame([record]).set_index("ts")
-
-    if os.path.exists(EXECUTIONS_FILE):
-        df_old = pd.read_parquet(EXECUTIONS_FILE)
-        df = pd.concat([df_old, df_new])
-        df = df[~df.index.duplicated(keep="last")]
-    else:
-        df = df_new
-
-    df.sort_index(inplace=True)
-    df.to_parquet(EXECUTIONS_FILE)
+        log_message(f"❌ Сверка с REST не удалась: {e}")
+        return
+    stream.state.reset(pos, orders, pos["mark_price"])
+
+def run_stream(session):
+    # Запись по событиям потоков: изменение позиции/ордеров — сразу,
+    # без изменений — heartbeat раз в HEARTBEAT_INTERVAL сек
+    stream = AccountStream(SYMBOL, CATEGORY, *load_keys())
+    stream.start()
+    resync_stream(stream, session)
+    last_resync = time.time()
+    recorder = ChangeRecorder(save_record, HEARTBEAT_INTERVAL)
+    next_minute = datetime.utcnow().replace(second=0, microsecond=0) + timedelta(minutes=1)
 
-    log_message(f"[{ts}] ✅ Обновлено\n"
-                f"  position_size = {pos['size']}\n"
-                f"  avg_price     = {pos['avg_price']}\n"
-                f"  side          = {pos['side']}\n"
-                f"  mark_price    = {pos['mark_price']}\n"
-                f"  position_open = {pos['size'] > 0}\n"
-                f"  order_count   = {order_count}\n"
-                f"  order_prices  = {prices}\n"
-                f"  order_sizes   = {sizes}")
-
-def wait_until_next_minute():
-    now = datetime.utcnow()
-    next_minute = (now + timedelta(minutes=1)).replace(second=0, microsecond=0)
-    time.sleep((next_minute - now).total_seconds())
+    while True:
+        timeout = min(max((next_minute - datetime.utcnow()).total_seconds(), 0),
+                      max(recorder.next_heartbeat() - time.time(), 0))
+        stream.state.wait(timeout)
+        now = datetime.utcnow()
+        try:
+            recorder.offer(now, stream.state.snapshot())
+        except Exception as e:
+            log_message(f"❌ Ошибка записи: {e}")
 
-def main_loop():
-    api_key, api_secret = load_keys()
-    session = HTTP(testnet=False, api_key=api_key, api_secret=api_secret)
+        if time.time() - last_resync > RESYNC_INTERVAL:
+            resync_stream(stream, session)
+            last_resync = time.time()
+        if now >= next_minute:
+            next_minute = now.replace(second=0, microsecond=0) + timedelta(minutes=1)
+            session.maybe_report()
 
-    log_message(f"=== Запуск записи позиций для {SYMBOL} в {datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')} ===")
+def run_sampling(session):
+    # Опрос каждые SAMPLE_INTERVAL сек; в журнал — только изменения и heartbeat
+    recorder = ChangeRecorder(save_record, HEARTBEAT_INTERVAL)
+    next_minute = datetime.utcnow().replace(second=0, microsecond=0) + timedelta(minutes=1)
 
     while True:
-        now = datetime.utcnow().replace(second=0, microsecond=0)
+        started = time.time()
+        now = datetime.utcnow().replace(microsecond=0)
         try:
-            update_executions_table(now, session)
+            recorder.offer(now, sample_state(session), started)
         except Exception as e:
-            log_message(f"❌ Общая ошибка в цикле: {e}")
-        wait_until_next_minute()
+            log_message(f"❌ Опрос пропущен: {e}")
+        if now >= next_minute:
+            next_minute = now.replace(second=0) + timedelta(minutes=1)
+            session.maybe_report()
+        time.sleep(max(SAMPLE_INTERVAL - (time.time() - started), 0))
+
+def main_loop():
+    api_key, api_secret = load_keys()
+    session = get_client(api_key, api_secret)
+
+    log_message(f"=== Запуск записи позиций для {SYMBOL} в {datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')} ({MODE}) ===")
+    if MODE == "ws":
+        run_stream(session)
+    run_sampling(session)
 
 if __name__ == "__main__":
     main_loop()
@@ -1,15 +1,20 @@
 import os
 import json
 import time
-import pandas as pd
 from datetime import datetime, timedelta
-from pybit.unified_trading import HTTP
 import argparse
 import sys
 
 # Добавляем путь к корню проекта, чтобы видеть account_state.py
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
 from account_state import update_after_position_close, check_entry_allowed
+from bybit_client import get_client
+from feature_store import has_features, read_last_features, features_commit_path
+from feature_snapshot import FeatureSnapshot, features_snapshot_path
+from read_cache import cached_read
+from execution_journal import has_executions, read_last_execution, executions_commit_path
+from commit_events import CommitCounter
+from account_poller import AccountPoller
 
 # === Аргументы и конфиг ===
 def load_config():
@@ -37,9 +42,13 @@ SHARED_DATA_PATH = os.path.join("strategy_data", BOT_NAME)
 os.makedirs(SHARED_DATA_PATH, exist_ok=True)
 
 SHARED_DATA_PATH = os.path.join("strategy_data", BOT_NAME)
-FEATURES_PATH = os.path.join(SHARED_DATA_PATH, "features.parquet")
+FEATURES_PATH = os.path.join(SHARED_DATA_PATH, "features")
+FEATURES_COMMITS = CommitCounter(features_commit_path(FEATURES_PATH))
+FEATURES_SNAPSHOT = FeatureSnapshot(features_snapshot_path(FEATURES_PATH))
 
-EXECUTIONS_PATH = os.path.join(DATA_PATH, "executions.parquet")
+EXECUTIONS_PATH = os.path.join(DATA_PATH, "executions")
+EXECUTIONS_COMMITS = CommitCounter(executions_commit_path(EXECUTIONS_PATH))
+POLLER = AccountPoller(os.environ.get("BYBIT_API_KEY"), CATEGORY, config.get("settle_coin", "USDT"))
 
 
 # === Параметры стратегии (общие и специфичные) ===
@@ -96,29 +105,40 @@ def get_qty_precision_from_exchange(session):
 
 
 def get_last_row_from_features():
-    if not os.path.exists(FEATURES_PATH):
+    # Последняя строка из <features>.latest — без чтения parquet
+    row = FEATURES_SNAPSHOT.read()
+    if row is not None:
+        return row
+    if not has_features(FEATURES_PATH):
         print(f"{datetime.utcnow()} ❌ Файл не найден: {FEATURES_PATH}")
         return None
-    df = pd.read_parquet(FEATURES_PATH)
-    df["ts"] = pd.to_datetime(df["ts"], utc=True)
-    df.sort_values("ts", inplace=True)
+    df = read_last_features(FEATURES_PATH)  # ts уже datetime UTC
     if df.empty:
         return None
     return df.iloc[-1].copy()
 
 
 def get_last_row_from_executions():
-    if not os.path.exists(EXECUTIONS_PATH):
-        print(f"{datetime.utcnow()} ❌ Файл не найден: {EXECUTIONS_PATH}")
+    if not has_executions(EXECUTIONS_PATH):
+        print(f"{datetime.utcnow()} ❌ Журнал не найден: {EXECUTIONS_PATH}")
         return None
-    df = pd.read_parquet(EXECUTIONS_PATH)
-    df.index = pd.to_datetime(df.index, utc=True)  # <- здесь
-    df.sort_index(inplace=True)
-    if df.empty:
+    # Последняя запись журнала, ts — колонкой (datetime UTC); пока запись
+    # позиций не публиковала новую — уже прочитанная строка
+    row = cached_read(EXECUTIONS_PATH, read_last_execution, version=EXECUTIONS_COMMITS.read()[0])
+    if row is None:
         return None
-    row = df.iloc[-1].copy()
-    row["ts"] = df.index[-1]  # <- возвращаем ts как колонку
-    return row
+    return row.copy()
+
+def get_mark_price(session, row_exec):
+    # Журнал пишет только изменения и heartbeat — mark price из общего снимка
+    # аккаунта (его каждые несколько секунд обновляет запись позиций)
+    try:
+        mark_price = POLLER.position(session, SYMBOL)["mark_price"]
+        if mark_price:
+            return mark_price
+    except Exception as e:
+        print(f"{datetime.utcnow()} ⚠️ Снимок аккаунта недоступен: {e}")
+    return float(row_exec["mark_price"])
 
 
 
@@ -239,16 +259,17 @@ def close_position_and_exit(session, position_size, qty_precision):
 
 
 def wait_until_next_minute():
+    # Просыпаемся, как только записаны новые признаки; без них — в 5 сек следующей минуты
     now = datetime.utcnow()
     next_minute = (now + timedelta(minutes=1)).replace(second=5, microsecond=0)
-    time.sleep((next_minute - now).total_seconds())
+    FEATURES_COMMITS.wait((next_minute - now).total_seconds())
 
 # === Основной цикл торговли ===
 def main():
     global last_grid_time, last_tp_update_time, first_grid_price
 
     api_key, api_secret = load_keys()
-    session = HTTP(testnet=False, api_key=api_key, api_secret=api_secret)
+    session = get_client(api_key, api_secret)
     qty_precision = get_qty_precision_from_exchange(session)
 
     print(f"=== Запуск торговли в {datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')} ===")
@@ -262,6 +283,7 @@ def main():
     last_order_count = 0
 
     while True:
+        session.maybe_report()
         row_feat = get_last_row_from_features()
         row_exec = get_last_row_from_executions()
 
@@ -284,9 +306,9 @@ def main():
         order_count = row_exec["order_count"]
         position_open = (position_size != 0)
 
-        ts = pd.to_datetime(row_feat["ts"], utc=True)
+        ts = row_feat["ts"]
         signal = int(row_feat["signal"])
-        mark_price = float(row_exec["mark_price"])
+        mark_price = get_mark_price(session, row_exec)
 
         print(f"{datetime.utcnow()} 🕒 ts = {ts} | signal = {signal} | open = {position_open} | "
               f"size = {position_size} | side = {side} | orders = {order_count} | "
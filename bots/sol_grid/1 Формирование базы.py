@@ -2,11 +2,13 @@ import os
 import time
 import json
 import argparse
-import pandas as pd
-from datetime import datetime, timedelta
-from datetime import datetime
-from pybit.unified_trading import HTTP
-from datetime import timezone
+import sys
+
+# Добавляем путь к корню проекта, чтобы видеть candle_collector.py
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from candle_collector import SymbolCollector
+from kline_stream import KlineStream
+from bybit_client import get_client
 
 
 
@@ -21,135 +23,25 @@ def load_config():
 
 parser = argparse.ArgumentParser()
 parser.add_argument("--symbol", type=str, help="Override символ из config.json")
+parser.add_argument("--mode", choices=["rest", "ws"], help="rest — опрос раз в минуту, ws — поток kline через WebSocket")
 args = parser.parse_args()
 
 config = load_config()
 SYMBOL = args.symbol.upper() if args.symbol else config.get("symbol", "BTCUSDT").upper()
 CATEGORY = config.get("category", "linear")
-symbol_lower = SYMBOL.lower()
+MODE = args.mode or config.get("ingest_mode", "rest")
+STREAM_IDLE_TIMEOUT = 90  # сек без закрытых свечей — догружаем по REST
+REPAIR_INTERVAL = 60      # сек между проходами починки дыр в истории
 
 BOT_NAME = os.environ.get("BOT_NAME", config.get("bot_name", "grid_bot"))
-DATA_PATH = os.path.join("strategy_data", BOT_NAME)
-os.makedirs(DATA_PATH, exist_ok=True)
-
-FILE_1MIN = os.path.join(DATA_PATH, f"{symbol_lower}_1min.parquet")
-FILE_5MIN = os.path.join(DATA_PATH, f"{symbol_lower}_5min.parquet")
-FILE_30MIN = os.path.join(DATA_PATH, f"{symbol_lower}_30min.parquet")
-FILE_1H = os.path.join(DATA_PATH, f"{symbol_lower}_1h.parquet")
-
-INTERVAL = "1"
-LIMIT = 1000 if not os.path.exists(FILE_1MIN) or os.path.getsize(FILE_1MIN) < 100000 else 1
+LEGACY_DATA_PATH = os.path.join("strategy_data", BOT_NAME)  # старое хранилище на бота
 
-def fetch_new_candles(start_time=None, limit=1000):
-    session = HTTP(testnet=False)
-    try:
-        params = {
-            "category": CATEGORY,
-            "symbol": SYMBOL,
-            "interval": INTERVAL,
-            "limit": limit,
-        }
-        if start_time:
-            params["start"] = int(start_time.timestamp() * 1000)
-
-        response = session.get_kline(**params)
-        if response.get("retMsg") != "OK":
-            print(f"[{datetime.utcnow().isoformat()}] ❌ Ошибка от API:", response)
-            return pd.DataFrame()
-
-        data = response.get("result", {}).get("list", [])
-        if not data:
-            print(f"[{datetime.utcnow().isoformat()}] ⚠️ Пустой ответ от API.")
-            return pd.DataFrame()
-
-        df = pd.DataFrame(data, columns=[
-            "timestamp", "open", "high", "low", "close", "volume", "turnover"
-        ])
-        df = df[["timestamp", "open", "high", "low", "close", "volume"]]
-        df["ts"] = pd.to_datetime(df["timestamp"].astype("int64"), unit='ms', utc=True)
-        df.set_index("ts", inplace=True)
-        df.drop(columns=["timestamp"], inplace=True)
-        df[["open", "high", "low", "close", "volume"]] = df[["open", "high", "low", "close", "volume"]].astype(float)
-        return df
-    except Exception as e:
-        print(f"[{datetime.utcnow().isoformat()}] ❌ Ошибка при запросе:", e)
-        return pd.DataFrame()
-
-def safe_load_parquet(path):
-    try:
-        df = pd.read_parquet(path)
-        if "ts" in df.columns:
-            df["ts"] = pd.to_datetime(df["ts"], utc=True)
-            df.set_index("ts", inplace=True)
-        return df
-    except Exception as e:
-        print(f"⚠️ Ошибка при чтении {path}: {e}")
-        if os.path.exists(path):
-            os.remove(path)
-        return pd.DataFrame()
-
-def safe_save_parquet(df, path):
-    tmp_file = path + ".tmp"
-    df_to_save = df.copy().reset_index()
-    df_to_save["ts"] = pd.to_datetime(df_to_save["ts"], utc=True)
-    df_to_save.to_parquet(tmp_file, index=False)
-    os.replace(tmp_file, path)
-
-def aggregate_and_save(df, rule, output_file):
-    agg_df = df.resample(rule).agg({
-        'open': 'first',
-        'high': 'max',
-        'low': 'min',
-        'close': 'last',
-        'volume': 'sum'
-    }).dropna()
-    agg_df = agg_df.reset_index()
-    agg_df["ts"] = pd.to_datetime(agg_df["ts"], utc=True)
-    agg_df.to_parquet(output_file, index=False)
-    print(f"📁 Сохранено: {output_file} ({len(agg_df)} строк)")
+# Свечи хранятся по символу — один сборщик на символ для всех стратегий
+collector = SymbolCollector(SYMBOL, CATEGORY, legacy_data_path=LEGACY_DATA_PATH)
 
 def update_parquet():
-    print(f"\n🕒 [{datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')}] 🔄 Обновление данных для {SYMBOL}...")
-
-    existing = safe_load_parquet(FILE_1MIN) if os.path.exists(FILE_1MIN) else pd.DataFrame()
-    combined = existing.copy()
-    now = datetime.utcnow().replace(tzinfo=timezone.utc, second=0, microsecond=0)
-
-    if existing.empty:
-        print("⚠️ База пуста — начинаем загрузку с нуля")
-        last_time = now - timedelta(minutes=10000)
-    else:
-        last_time = existing.index.max()
-        print(f"📌 Последний timestamp в базе: {last_time}")
-
-    while last_time < now - timedelta(minutes=1):
-        fetch_from = last_time + timedelta(minutes=1)
-        # Определим лимит: если данные старые — берём пачку, если почти в реальном времени — берём по одной
-        limit = 1000 if (now - fetch_from).total_seconds() > 180 else 1
-        new_data = fetch_new_candles(fetch_from, limit=limit)
-
-        if new_data.empty:
-            print("❌ Нет новых данных от API — остановка загрузки.")
-            break
-
-        new_data.index = pd.to_datetime(new_data.index, utc=True)
-        new_data = new_data[~new_data.index.duplicated(keep='last')]
-        combined = pd.concat([combined, new_data])
-        combined = combined[~combined.index.duplicated(keep='last')]
-        combined.sort_index(inplace=True)
-
-        last_time = combined.index.max()
-        print(f"📈 Добавлено: {len(new_data)} свечей | Новый последний ts: {last_time}")
-
-        time.sleep(0.25)
-
-    safe_save_parquet(combined, FILE_1MIN)
-    print(f"✅ Всего свечей после обновления: {len(combined)}")
-    aggregate_and_save(combined, '5min', FILE_5MIN)
-    aggregate_and_save(combined, '30min', FILE_30MIN)
-    aggregate_and_save(combined, '1h', FILE_1H)
-
-    print(f"📈 Последняя свеча:\n{combined.tail(1)}")
+    collector.update()
+    print(f"📈 Последняя свеча:\n{collector.last_candle()}")
 
 
 def sync_to_next_minute(start_time):
@@ -159,11 +51,35 @@ def sync_to_next_minute(start_time):
     if delay > 0:
         time.sleep(delay)
 
+def run_stream():
+    stream = KlineStream(SYMBOL, CATEGORY)
+    stream.start()
+    update_parquet()  # догоняем историю по REST, дальше — только поток
+    last_repair = 0
+
+    while True:
+        if time.time() - last_repair > REPAIR_INTERVAL:
+            collector.repair_gaps()
+            last_repair = time.time()
+        item = stream.get(timeout=STREAM_IDLE_TIMEOUT)
+        if item is None:
+            print(f"⚠️ {STREAM_IDLE_TIMEOUT} сек без свечей из WebSocket — догружаем по REST")
+            update_parquet()
+            continue
+        symbol, bars = item
+        collector.on_bars(bars)
+
+
 if __name__ == "__main__":
     try:
+        collector.start()
+        if MODE == "ws":
+            run_stream()
         while True:
             start_time = time.time()
             update_parquet()
+            collector.repair_gaps()
+            get_client().maybe_report()
             sync_to_next_minute(start_time)
     except KeyboardInterrupt:
         print("🛑 Остановка скрипта.")
@@ -0,0 +1,180 @@
+import os
+import time
+import random
+import threading
+from collections import defaultdict
+import requests
+from requests.adapters import HTTPAdapter
+from pybit.unified_trading import HTTP
+from pybit.exceptions import FailedRequestError, InvalidRequestError
+
+from rate_governor import RateGovernor, PRIORITY_ORDERS, PRIORITY_QUERIES
+
+# === Общий клиент биржи для всех скриптов ===
+# Один HTTP-клиент pybit на процесс (и на API-ключ) с keep-alive пулом соединений,
+# таймаутами, повтором временных ошибок с джиттером и счётчиками задержек
+# по каждому методу. Настройки приходят из окружения — run_strategies.py
+# передаёт их дочерним процессам из секции "http" в accounts.json.
+# Приватные вызовы проходят через общий на ключ RateGovernor (rate_governor.py).
+
+CONNECT_TIMEOUT = float(os.environ.get("BYBIT_HTTP_CONNECT_TIMEOUT", 3))
+READ_TIMEOUT = float(os.environ.get("BYBIT_HTTP_READ_TIMEOUT", 10))
+RETRIES = int(os.environ.get("BYBIT_HTTP_RETRIES", 3))
+RETRY_BASE_DELAY = float(os.environ.get("BYBIT_HTTP_RETRY_DELAY", 0.5))
+POOL_SIZE = int(os.environ.get("BYBIT_HTTP_POOL_SIZE", 10))
+LATENCY_REPORT_INTERVAL = int(os.environ.get("BYBIT_LATENCY_REPORT_INTERVAL", 600))
+
+SETTINGS_ENV = {
+    "connect_timeout": "BYBIT_HTTP_CONNECT_TIMEOUT",
+    "read_timeout": "BYBIT_HTTP_READ_TIMEOUT",
+    "retries": "BYBIT_HTTP_RETRIES",
+    "retry_delay": "BYBIT_HTTP_RETRY_DELAY",
+    "pool_size": "BYBIT_HTTP_POOL_SIZE",
+    "latency_report_interval": "BYBIT_LATENCY_REPORT_INTERVAL",
+    "key_rate": "BYBIT_KEY_RATE",
+    "key_burst": "BYBIT_KEY_BURST",
+}
+
+# Коды Bybit, при которых запрос имеет смысл повторить (внутренние ошибки/таймаут сервера)
+TRANSIENT_RET_CODES = {10000, 10016}
+# Лимит запросов ключа: запрос отклонён и не выполнен — повторяем после сброса
+# лимита (заголовок X-Bapi-Limit-Reset-Timestamp), всеми процессами ключа
+RATE_LIMIT_RET_CODE = 10006
+# Создание ордера не идемпотентно — повторяем, только если соединение не установилось
+NON_IDEMPOTENT_METHODS = {"place_order", "amend_order", "place_batch_order", "amend_batch_order"}
+# Ордера и отмены идут вперёд опроса позиций/ордеров/баланса
+ORDER_METHODS = NON_IDEMPOTENT_METHODS | {"cancel_order", "cancel_all_orders", "cancel_batch_order"}
+
+
+def settings_env(settings):
+    # {"read_timeout": 5, ...} → {"BYBIT_HTTP_READ_TIMEOUT": "5", ...}
+    return {SETTINGS_ENV[k]: str(v) for k, v in settings.items() if k in SETTINGS_ENV}
+
+def _is_rate_limited(error):
+    return isinstance(error, InvalidRequestError) and error.status_code == RATE_LIMIT_RET_CODE
+
+def _limit_reset_delay(error):
+    # Секунды до сброса лимита по заголовку ответа; 0 — заголовка нет
+    reset_ms = (error.resp_headers or {}).get("X-Bapi-Limit-Reset-Timestamp")
+    try:
+        return max(int(reset_ms) / 1000 - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return 0.0
+
+def _is_transient(error, method_name):
+    if _is_rate_limited(error):
+        return True
+    if method_name in NON_IDEMPOTENT_METHODS:
+        return isinstance(error, requests.exceptions.ConnectTimeout)
+    if isinstance(error, (requests.exceptions.Timeout, requests.exceptions.ConnectionError)):
+        return True
+    if isinstance(error, FailedRequestError):
+        # Без force_retry pybit поднимает 4xx только на настоящие ошибки запроса — их не повторяем
+        return error.status_code is not None and error.status_code >= 500
+    if isinstance(error, InvalidRequestError):
+        return error.status_code in TRANSIENT_RET_CODES
+    return False
+
+
+class ExchangeClient:
+    def __init__(self, api_key=None, api_secret=None, testnet=False, retries=RETRIES):
+        self.retries = retries
+        self.session = HTTP(
+            testnet=testnet,
+            api_key=api_key,
+            api_secret=api_secret,
+            timeout=(CONNECT_TIMEOUT, READ_TIMEOUT),
+            max_retries=1,
+        )
+        # Свои повторы pybit (10002, 10006, ... со сном внутри вызова) выключены:
+        # повторяет только _call — с джиттером, через RateGovernor и в статистике.
+        # Пустой набор в конструкторе pybit заменяет на свой, поэтому — после
+        self.session.retry_codes = set()
+        # Пул keep-alive соединений: TLS-рукопожатие один раз на соединение, а не на вызов
+        adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE)
+        self.session.client.mount("https://", adapter)
+        # Публичные вызовы ограничены по IP, а не по ключу — их не считаем
+        self.governor = RateGovernor(api_key) if api_key else None
+        self.stats = defaultdict(lambda: {"calls": 0, "errors": 0, "retries": 0, "total_ms": 0.0, "max_ms": 0.0, "wait_ms": 0.0})
+        self.stats_lock = threading.Lock()
+        self.last_report = time.time()
+
+    def __getattr__(self, name):
+        method = getattr(self.session, name)
+        if not callable(method):
+            return method
+
+        def call(*args, **kwargs):
+            return self._call(name, method, args, kwargs)
+        return call
+
+    def _record(self, name, started, error=False, retry=False):
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        with self.stats_lock:
+            stat = self.stats[name]
+            stat["calls"] += 1
+            stat["total_ms"] += elapsed_ms
+            stat["max_ms"] = max(stat["max_ms"], elapsed_ms)
+            stat["errors"] += int(error)
+            stat["retries"] += int(retry)
+
+    def _call(self, name, method, args, kwargs):
+        attempt = 0
+        priority = PRIORITY_ORDERS if name in ORDER_METHODS else PRIORITY_QUERIES
+        while True:
+            if self.governor is not None:
+                waited = self.governor.acquire(priority)
+                with self.stats_lock:
+                    self.stats[name]["wait_ms"] += waited * 1000
+            started = time.perf_counter()
+            try:
+                result = method(*args, **kwargs)
+                self._record(name, started)
+                return result
+            except Exception as e:
+                retry = attempt < self.retries and _is_transient(e, name)
+                self._record(name, started, error=True, retry=retry)
+                if not retry:
+                    raise
+                # Экспоненциальная пауза с джиттером, чтобы процессы не повторяли хором
+                delay = RETRY_BASE_DELAY * (2 ** attempt) * random.uniform(0.5, 1.5)
+                if _is_rate_limited(e):
+                    delay = max(delay, _limit_reset_delay(e))
+                    print(f"⚠️ {name}: лимит запросов ключа, повтор через {delay:.2f} сек")
+                    if self.governor is not None:
+                        # Пауза для всех процессов ключа: её отсчитает acquire перед повтором
+                        self.governor.backoff(delay)
+                        delay = 0
+                else:
+                    print(f"⚠️ {name}: временная ошибка ({e.__class__.__name__}), повтор через {delay:.2f} сек")
+                time.sleep(delay)
+                attempt += 1
+
+    def latency_report(self):
+        with self.stats_lock:
+            lines = [
+                f"  {name:<24} вызовов {s['calls']:>6} | ошибок {s['errors']:>4} | повторов {s['retries']:>4} | "
+                f"ср {s['total_ms'] / max(s['calls'], 1):.0f} мс | макс {s['max_ms']:.0f} мс | "
+                f"ожидание лимита {s['wait_ms']:.0f} мс"
+                for name, s in sorted(self.stats.items())
+            ]
+        return "\n".join(lines)
+
+    def maybe_report(self):
+        # Периодически печатает задержки по методам — вызывается из рабочих циклов
+        if time.time() - self.last_report < LATENCY_REPORT_INTERVAL or not self.stats:
+            return
+        self.last_report = time.time()
+        print(f"📊 Задержки API:\n{self.latency_report()}")
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+def get_client(api_key=None, api_secret=None, testnet=False):
+    # Один клиент на (ключ, сеть) в процессе — все вызовы идут через общий пул
+    key = (api_key, testnet)
+    with _clients_lock:
+        if key not in _clients:
+            _clients[key] = ExchangeClient(api_key=api_key, api_secret=api_secret, testnet=testnet)
+        return _clients[key]
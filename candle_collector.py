@@ -0,0 +1,189 @@
+import os
+import time
+import threading
+import pandas as pd
+from datetime import datetime, timedelta, timezone
+
+from candle_store import (append_candles, read_candles, last_candle_ts, migrate_single_file,
+                          market_store_path, migrate_bot_store, upgrade_store)
+from candle_resampler import BarAggregator
+from backfill import backfill_candles, parse_kline_list, WINDOW_MINUTES
+from candle_gaps import (record_candles, record_repair_attempt, load_gap_index,
+                         ts_to_minute, minute_to_ts)
+from bybit_client import get_client
+from commit_events import CommitCounter, candle_commit_path
+
+# === Сборщик свечей одного символа ===
+# Держит хранилища 1min/5min/30min/1h символа и агрегаторы старших таймфреймов.
+# update() догоняет историю по REST, on_bars() принимает закрытые свечи из
+# WebSocket. Используется и скриптом «1 Формирование базы.py» (один символ),
+# и общим collector.py (все символы в одном процессе).
+# Каждая запись отмечается в индексе дыр (candle_gaps.py), repair_gaps()
+# докачивает ровно пропущенные диапазоны. После каждой записи увеличивается
+# счётчик commit.seq в хранилище 1min — по нему просыпается подготовка признаков.
+
+TIMEFRAMES = ["5min", "30min", "1h"]
+INITIAL_HISTORY_MINUTES = 10000
+REPAIR_BUDGET = 15  # сек на починку дыр за один цикл
+
+
+class SymbolCollector:
+    def __init__(self, symbol, category="linear", legacy_data_path=None):
+        self.symbol = symbol.upper()
+        self.category = category
+        self.legacy_data_path = legacy_data_path
+        self.store_1min = market_store_path(self.symbol, category, "1min")
+        # Агрегаторы держат открытый бар каждого таймфрейма в памяти
+        self.aggregators = [
+            BarAggregator(self.store_1min, market_store_path(self.symbol, category, rule), rule)
+            for rule in TIMEFRAMES
+        ]
+        self.last_time = None
+        # Починка дыр идёт в своём потоке параллельно с потоком свечей
+        self.write_lock = threading.Lock()
+        self.commits = CommitCounter(candle_commit_path(self.store_1min))
+
+    def log(self, message):
+        print(f"[{self.symbol}] {message}")
+
+    def start(self):
+        # Перенос старых хранилищ strategy_data/<bot>/ и догонка агрегатов
+        if self.legacy_data_path:
+            symbol_lower = self.symbol.lower()
+            for timeframe in ["1min"] + TIMEFRAMES:
+                migrate_bot_store(os.path.join(self.legacy_data_path, f"{symbol_lower}_{timeframe}"),
+                                  market_store_path(self.symbol, self.category, timeframe))
+            migrate_single_file(os.path.join(self.legacy_data_path, f"{symbol_lower}_1min.parquet"),
+                                self.store_1min)
+        for timeframe in ["1min"] + TIMEFRAMES:
+            upgrade_store(market_store_path(self.symbol, self.category, timeframe))
+        for aggregator in self.aggregators:
+            aggregator.catch_up()
+        self.last_time = last_candle_ts(self.store_1min)
+
+    def fetch_new_candles(self, start_time=None, limit=1000, end_time=None):
+        try:
+            params = {
+                "category": self.category,
+                "symbol": self.symbol,
+                "interval": "1",
+                "limit": limit,
+            }
+            if start_time:
+                params["start"] = int(start_time.timestamp() * 1000)
+            if end_time:
+                params["end"] = int(end_time.timestamp() * 1000)
+
+            response = get_client().get_kline(**params)
+            if response.get("retMsg") != "OK":
+                self.log(f"❌ Ошибка от API: {response}")
+                return pd.DataFrame()
+
+            data = response.get("result", {}).get("list", [])
+            if not data:
+                self.log("⚠️ Пустой ответ от API.")
+                return pd.DataFrame()
+            return parse_kline_list(data)
+        except Exception as e:
+            self.log(f"❌ Ошибка при запросе: {e}")
+            return pd.DataFrame()
+
+    def _write(self, new_data):
+        # Пишем только затронутые дневные партиции, без перезаписи всей истории
+        with self.write_lock:
+            append_candles(self.store_1min, new_data)
+            record_candles(self.store_1min, new_data.index)
+            for aggregator in self.aggregators:
+                bars = aggregator.update(new_data)
+                if not bars.empty:
+                    self.log(f"📁 {aggregator.rule}: обновлено баров {len(bars)}, последний {bars.index[-1]}")
+            # Уведомляем после записи всех таймфреймов
+            self.commits.publish(new_data.index.max())
+
+    def update(self):
+        # REST-догонка от последней сохранённой свечи до последней закрытой минуты
+        self.log(f"🕒 [{datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')}] 🔄 Обновление данных")
+        last_time = last_candle_ts(self.store_1min)
+        now = datetime.utcnow().replace(tzinfo=timezone.utc, second=0, microsecond=0)
+
+        if last_time is None:
+            self.log("⚠️ База пуста — начинаем загрузку с нуля")
+            backfill_candles(self.store_1min, self.symbol, self.category,
+                             now - timedelta(minutes=INITIAL_HISTORY_MINUTES), now)
+            for aggregator in self.aggregators:
+                aggregator.catch_up()
+            last_time = last_candle_ts(self.store_1min) or now - timedelta(minutes=INITIAL_HISTORY_MINUTES)
+        else:
+            self.log(f"📌 Последний timestamp в базе: {last_time}")
+
+        added = 0
+        while last_time < now - timedelta(minutes=1):
+            fetch_from = last_time + timedelta(minutes=1)
+            # Если данные старые — берём пачку, если почти в реальном времени — по одной
+            limit = 1000 if (now - fetch_from).total_seconds() > 180 else 1
+            new_data = self.fetch_new_candles(fetch_from, limit=limit)
+
+            if new_data.empty:
+                self.log("❌ Нет новых данных от API — остановка загрузки.")
+                break
+
+            self._write(new_data)
+            added += len(new_data)
+
+            if new_data.index.max() <= last_time:
+                break
+            last_time = new_data.index.max()
+            self.log(f"📈 Добавлено: {len(new_data)} свечей | Новый последний ts: {last_time}")
+
+            time.sleep(0.25)
+
+        self.last_time = last_time
+        return added
+
+    def repair_gaps(self, budget=REPAIR_BUDGET):
+        # Докачиваем пропущенные диапазоны из индекса — сначала самые свежие.
+        # Поздние минуты агрегаторы учитывают сами, пересчитывая их бакеты.
+        started = time.time()
+        repaired = 0
+        for gap in reversed(load_gap_index(self.store_1min)["gaps"]):
+            gap_start, gap_end = minute_to_ts(gap[0]), minute_to_ts(gap[1])
+            window_start = gap_start
+            while window_start <= gap_end:
+                if time.time() - started > budget:
+                    self.log(f"⏳ Починка дыр прервана по времени, докачано {repaired} свечей")
+                    return repaired
+                window_end = min(gap_end, window_start + timedelta(minutes=WINDOW_MINUTES - 1))
+                new_data = self.fetch_new_candles(window_start, limit=WINDOW_MINUTES, end_time=window_end)
+                if not new_data.empty:
+                    new_data = new_data[(new_data.index >= window_start) & (new_data.index <= window_end)]
+                if not new_data.empty:
+                    self._write(new_data)
+                    repaired += len(new_data)
+                # Что в окне так и не пришло — считаем попытку; после нескольких дыра
+                # помечается пустой (простой биржи) и больше не запрашивается
+                lo, hi = ts_to_minute(window_start), ts_to_minute(window_end)
+                for rest in load_gap_index(self.store_1min)["gaps"]:
+                    if rest[0] <= hi and rest[1] >= lo:
+                        record_repair_attempt(self.store_1min, rest)
+                window_start = window_end + timedelta(minutes=1)
+        if repaired:
+            self.log(f"🩹 Дыры в истории закрыты: докачано {repaired} свечей")
+        return repaired
+
+    def on_bars(self, bars):
+        # Закрытые свечи из WebSocket; дыру после переподключения добираем по REST
+        if self.last_time is not None:
+            if bars.index.min() > self.last_time + timedelta(minutes=1):
+                self.log(f"🕳️ Пропуск {self.last_time} → {bars.index.min()} — догружаем по REST")
+                self.update()
+            bars = bars[bars.index > self.last_time]
+        if bars.empty:
+            return 0
+
+        self._write(bars)
+        self.last_time = bars.index.max()
+        self.log(f"📈 [{datetime.utcnow().strftime('%H:%M:%S')}] WS свеча {self.last_time} close={bars['close'].iloc[-1]}")
+        return len(bars)
+
+    def last_candle(self):
+        return read_candles(self.store_1min, start=self.last_time) if self.last_time is not None else pd.DataFrame()
@@ -0,0 +1,185 @@
+import os
+import json
+from contextlib import contextmanager
+import numpy as np
+import pandas as pd
+
+from candle_store import list_partitions
+from parquet_schema import read_table
+from file_lock import locked_file
+
+# === Индекс пропущенных минут хранилища 1min ===
+# <store>/gaps.json хранит покрытый диапазон [first, last] и список дыр внутри
+# него — диапазонов пропущенных минут [start, end] включительно (в минутах от эпохи).
+# Индекс обновляется на каждой записи, поэтому вопрос «полон ли диапазон»
+# решается по нему без чтения самих свечей.
+# Дыры, которые биржа так и не отдала за MAX_REPAIR_ATTEMPTS попыток (простои
+# биржи), переносятся в "empty" — их больше не запрашиваем.
+# Индекс меняется под своей файловой блокировкой, а сами свечи пишутся под
+# блокировкой хранилища (candle_store.append_candles) — сборщик и backfill.py
+# могут писать одно хранилище из разных процессов.
+
+GAP_INDEX_FILE = "gaps.json"
+MAX_REPAIR_ATTEMPTS = 3
+MINUTE_NS = 60_000_000_000
+
+
+def _to_minutes(index):
+    return pd.DatetimeIndex(index).tz_convert("UTC").as_unit("ns").asi8 // MINUTE_NS
+
+def ts_to_minute(ts):
+    return int(_to_minutes([pd.Timestamp(ts)])[0])
+
+def minute_to_ts(minute):
+    return pd.Timestamp(int(minute) * MINUTE_NS, tz="UTC")
+
+def _ranges(minutes):
+    # Отсортированные уникальные минуты → [[start, end], ...]
+    if len(minutes) == 0:
+        return []
+    breaks = np.flatnonzero(np.diff(minutes) != 1)
+    starts = np.concatenate(([minutes[0]], minutes[breaks + 1]))
+    ends = np.concatenate((minutes[breaks], [minutes[-1]]))
+    return [[int(s), int(e)] for s, e in zip(starts, ends)]
+
+def _missing(start, end, present):
+    # Минуты [start, end], которых нет в present, в виде диапазонов
+    if start > end:
+        return []
+    span = np.arange(start, end + 1)
+    return _ranges(np.setdiff1d(span, present, assume_unique=True))
+
+def _index_path(store_path):
+    return os.path.join(store_path, GAP_INDEX_FILE)
+
+def _save_index(store_path, index):
+    path = _index_path(store_path)
+    tmp_file = path + ".tmp"
+    with open(tmp_file, "w") as f:
+        json.dump(index, f)
+    os.replace(tmp_file, path)
+
+@contextmanager
+def _locked(store_path):
+    os.makedirs(store_path, exist_ok=True)
+    with locked_file(_index_path(store_path) + ".lock"):
+        yield
+
+def rebuild_gap_index(store_path):
+    # Полный проход по хранилищу — только если индекса ещё нет
+    frames = [read_table(path, columns=["ts"])["ts"] for _, path in list_partitions(store_path)]
+    index = {"first": None, "last": None, "gaps": [], "empty": [], "attempts": {}}
+    if frames:
+        minutes = np.unique(_to_minutes(pd.concat(frames)))
+        if len(minutes):
+            index["first"] = int(minutes[0])
+            index["last"] = int(minutes[-1])
+            index["gaps"] = _missing(index["first"], index["last"], minutes)
+    _save_index(store_path, index)
+    return index
+
+def load_gap_index(store_path):
+    path = _index_path(store_path)
+    if not os.path.exists(path):
+        return rebuild_gap_index(store_path)
+    with open(path) as f:
+        return json.load(f)
+
+def record_candles(store_path, ts_index):
+    # Вызывается после каждой записи в хранилище: закрывает заполненные дыры
+    # и добавляет новые, если запись расширила покрытый диапазон
+    if len(ts_index) == 0:
+        return load_gap_index(store_path)
+    with _locked(store_path):
+        return _record_candles(store_path, ts_index)
+
+def _record_candles(store_path, ts_index):
+    index = load_gap_index(store_path)
+    minutes = np.unique(_to_minutes(ts_index))
+    lo, hi = int(minutes[0]), int(minutes[-1])
+
+    gaps = []
+    for start, end in index["gaps"]:
+        if end < lo or start > hi:
+            gaps.append([start, end])
+        else:
+            gaps.extend(_missing(start, end, minutes))
+    # Простой биржи, в который всё же пришли минуты, остаётся простоем без них
+    empty = []
+    for start, end in index["empty"]:
+        if end < lo or start > hi:
+            empty.append([start, end])
+        else:
+            empty.extend(_missing(start, end, minutes))
+
+    if index["first"] is None:
+        index["first"], index["last"] = lo, hi
+        gaps.extend(_missing(lo, hi, minutes))
+    else:
+        if lo < index["first"]:
+            gaps.extend(_missing(lo, index["first"] - 1, minutes))
+            index["first"] = lo
+        if hi > index["last"]:
+            gaps.extend(_missing(index["last"] + 1, hi, minutes))
+            index["last"] = hi
+
+    index["gaps"] = sorted(gaps)
+    index["empty"] = sorted(empty)
+    live = {str(start) for start, _ in index["gaps"]}
+    index["attempts"] = {k: v for k, v in index.get("attempts", {}).items() if k in live}
+    _save_index(store_path, index)
+    return index
+
+def record_repair_attempt(store_path, gap):
+    # Дыра не закрылась после запроса — после MAX_REPAIR_ATTEMPTS считаем её простоем биржи
+    with _locked(store_path):
+        _record_repair_attempt(store_path, gap)
+
+def _record_repair_attempt(store_path, gap):
+    index = load_gap_index(store_path)
+    key = str(gap[0])
+    attempts = index.setdefault("attempts", {})
+    attempts[key] = attempts.get(key, 0) + 1
+    if attempts[key] >= MAX_REPAIR_ATTEMPTS and gap in index["gaps"]:
+        index["gaps"].remove(gap)
+        index["empty"].append(gap)
+        del attempts[key]
+        print(f"🕳️ {store_path}: {minute_to_ts(gap[0])} → {minute_to_ts(gap[1])} нет на бирже — помечено пустым")
+    _save_index(store_path, index)
+
+def missing_ranges(store_path, start=None, end=None, include_empty=False):
+    # Пропущенные диапазоны [(start_ts, end_ts), ...], пересекающие [start, end]
+    index = load_gap_index(store_path)
+    lo = ts_to_minute(start) if start is not None else None
+    hi = ts_to_minute(end) if end is not None else None
+    ranges = index["gaps"] + (index["empty"] if include_empty else [])
+    return [
+        (minute_to_ts(s), minute_to_ts(e))
+        for s, e in sorted(ranges)
+        if (hi is None or s <= hi) and (lo is None or e >= lo)
+    ]
+
+def is_range_complete(store_path, start, end, include_empty=False):
+    # Есть ли все минуты [start, end] — только по индексу, без чтения свечей.
+    # Простои биржи ("empty") по умолчанию не считаются пропуском данных.
+    index = load_gap_index(store_path)
+    if index["first"] is None:
+        return False
+    lo, hi = ts_to_minute(start), ts_to_minute(end)
+    if lo < index["first"] or hi > index["last"]:
+        return False
+    return not missing_ranges(store_path, start, end, include_empty=include_empty)
+
+def uncovered_ranges(store_path, start, end):
+    # Минуты [start, end], которых нет в хранилище: дыры и всё за пределами
+    # покрытого диапазона (простои биржи из "empty" не считаются)
+    index = load_gap_index(store_path)
+    lo, hi = ts_to_minute(start), ts_to_minute(end)
+    if lo > hi:
+        return []
+    if index["first"] is None:
+        ranges = [[lo, hi]]
+    else:
+        ranges = [[lo, min(hi, index["first"] - 1)], [max(lo, index["last"] + 1), hi]]
+        ranges += [[max(s, lo), min(e, hi)] for s, e in index["gaps"]]
+    return [(minute_to_ts(s), minute_to_ts(e)) for s, e in sorted(ranges) if s <= e]
@@ -0,0 +1,123 @@
+import pandas as pd
+
+from candle_store import append_candles, read_candles, last_candle_ts
+
+# === Инкрементальная агрегация 1min → 5min/30min/1h ===
+# Вместо resample() по всей истории держим в памяти состояние открытого бара
+# старшего таймфрейма. Новая минута меняет только этот бар (или закрывает его
+# и открывает следующий), и в хранилище дописываются только изменённые бары.
+# Стоимость минутного обновления постоянна и не зависит от длины истории.
+
+AGG_RULES = {
+    "open": "first",
+    "high": "max",
+    "low": "min",
+    "close": "last",
+    "volume": "sum",
+}
+
+
+def resample_candles(df, rule):
+    # Полная агрегация диапазона — нужна только при догонке и для опоздавших минут
+    return df.resample(rule).agg(AGG_RULES).dropna()
+
+
+class BarAggregator:
+    def __init__(self, source_store, target_store, rule):
+        self.source_store = source_store
+        self.target_store = target_store
+        self.rule = rule
+        self.freq = pd.Timedelta(rule)
+        self.bucket = None       # начало открытого бара
+        self.last_minute = None  # последняя учтённая минута открытого бара
+        self.bar = None          # {"open", "high", "low", "close", "volume"}
+
+    def catch_up(self):
+        # Разовая догонка при старте: пересчитываем бары начиная с последнего
+        # сохранённого (он мог быть незакрытым) и восстанавливаем открытый бар
+        target_last = last_candle_ts(self.target_store)
+        minutes = read_candles(self.source_store, start=target_last)
+        if minutes.empty:
+            return
+        bars = resample_candles(minutes, self.rule)
+        append_candles(self.target_store, bars)
+        self._reset_from_minutes(read_candles(self.source_store, start=bars.index[-1]))
+        print(f"🧮 {self.target_store}: догонка {len(bars)} баров, открытый бар {self.bucket}")
+
+    def rebuild_range(self, start, end):
+        # Пересборка баров после догрузки старой истории (backfill.py)
+        start = pd.Timestamp(start).floor(self.freq)
+        end = pd.Timestamp(end).floor(self.freq) + self.freq - pd.Timedelta(minutes=1)
+        minutes = read_candles(self.source_store, start, end)
+        if minutes.empty:
+            return
+        bars = resample_candles(minutes, self.rule)
+        append_candles(self.target_store, bars)
+        print(f"🧮 {self.target_store}: пересобрано {len(bars)} баров {bars.index[0]} → {bars.index[-1]}")
+
+    def _reset_from_minutes(self, minutes):
+        last = minutes.iloc[-1]
+        self.bucket = minutes.index[-1].floor(self.freq)
+        self.last_minute = minutes.index[-1]
+        self.bar = {
+            "open": float(minutes["open"].iloc[0]),
+            "high": float(minutes["high"].max()),
+            "low": float(minutes["low"].min()),
+            "close": float(last["close"]),
+            "volume": float(minutes["volume"].sum()),
+        }
+
+    def _recompute_bucket(self, bucket):
+        # Опоздавшие минуты (догрузка дыр) — пересобираем их бар из 1min
+        minutes = read_candles(self.source_store, bucket, bucket + self.freq - pd.Timedelta(minutes=1))
+        if minutes.empty:
+            return None
+        if bucket == self.bucket:
+            self._reset_from_minutes(minutes)
+        return resample_candles(minutes, self.rule)
+
+    def update(self, minutes):
+        # minutes — свежие 1min свечи (индекс ts), уже записанные в source_store
+        if minutes.empty:
+            return pd.DataFrame()
+        changed = {}
+        late_buckets = set()
+
+        for ts, row in minutes.sort_index().iterrows():
+            bucket = ts.floor(self.freq)
+            if self.bucket is None or bucket > self.bucket:
+                self.bucket = bucket
+                self.last_minute = ts
+                self.bar = {
+                    "open": float(row["open"]),
+                    "high": float(row["high"]),
+                    "low": float(row["low"]),
+                    "close": float(row["close"]),
+                    "volume": float(row["volume"]),
+                }
+            elif bucket == self.bucket and ts > self.last_minute:
+                self.last_minute = ts
+                self.bar["high"] = max(self.bar["high"], float(row["high"]))
+                self.bar["low"] = min(self.bar["low"], float(row["low"]))
+                self.bar["close"] = float(row["close"])
+                self.bar["volume"] += float(row["volume"])
+            else:
+                late_buckets.add(bucket)
+                continue
+            changed[self.bucket] = dict(self.bar)
+
+        frames = []
+        if changed:
+            frames.append(pd.DataFrame.from_dict(changed, orient="index"))
+        for bucket in sorted(late_buckets):
+            bars = self._recompute_bucket(bucket)
+            if bars is not None:
+                frames.append(bars)
+        if not frames:
+            return pd.DataFrame()
+
+        bars = pd.concat(frames)
+        bars = bars[~bars.index.duplicated(keep="last")].sort_index()
+        bars.index.name = "ts"
+        append_candles(self.target_store, bars)
+        return bars
@@ -0,0 +1,213 @@
+import os
+import json
+import pandas as pd
+
+from parquet_schema import read_table, write_table, is_compact, read_tail, ts_range, ts_to_ms, ms_to_ts
+from file_lock import locked_file
+from read_cache import cached_read
+
+# === Партиционированное хранилище свечей ===
+# Вместо одного растущего parquet-файла свечи лежат по одной партиции на UTC-день:
+#   <store_path>/YYYY-MM-DD.parquet
+# Новая минута перезаписывает только партицию текущего дня (максимум 1440 строк),
+# поэтому стоимость обновления не зависит от длины истории.
+# Формат файлов — компактная схема parquet_schema.py (ts int64 мс, zstd).
+# Запись в хранилище — под файловой блокировкой <store>/.write.lock, так что
+# писать одно хранилище могут несколько процессов.
+# Запись, которая переписывает бары раньше последнего сохранённого (починка
+# дыр, опоздавшие минуты, догрузка истории), отмечается в <store>/rewrites.json:
+# номер записи и самый ранний переписанный ts. Потребители (indicator_engine)
+# помнят номер, до которого всё учли, и пересчитывают с этого ts.
+
+# Свечи общие для всех стратегий на символе: strategy_data/market/<category>/<symbol>/<timeframe>
+MARKET_DATA_ROOT = os.path.join("strategy_data", "market")
+
+PARTITION_SUFFIX = ".parquet"
+PARTITION_FORMAT = "%Y-%m-%d"
+OHLCV_COLUMNS = ["open", "high", "low", "close", "volume"]
+REWRITES_FILE = "rewrites.json"
+WRITE_LOCK_FILE = ".write.lock"
+MAX_REWRITES = 1000
+
+
+def market_store_path(symbol, category, timeframe):
+    return os.path.join(MARKET_DATA_ROOT, category, symbol.lower(), timeframe)
+
+def _partition_path(store_path, day):
+    return os.path.join(store_path, day.strftime(PARTITION_FORMAT) + PARTITION_SUFFIX)
+
+def list_partitions(store_path):
+    # Список (день, путь) по возрастанию дня — имя файла и есть ключ партиции
+    if not os.path.isdir(store_path):
+        return []
+    partitions = []
+    for name in os.listdir(store_path):
+        if not name.endswith(PARTITION_SUFFIX):
+            continue
+        try:
+            day = pd.Timestamp(name[:-len(PARTITION_SUFFIX)], tz="UTC")
+        except ValueError:
+            continue
+        partitions.append((day, os.path.join(store_path, name)))
+    partitions.sort(key=lambda p: p[0])
+    return partitions
+
+def _to_utc(value):
+    ts = pd.Timestamp(value)
+    return ts.tz_localize("UTC") if ts.tzinfo is None else ts.tz_convert("UTC")
+
+def _empty_frame():
+    return pd.DataFrame(columns=OHLCV_COLUMNS, index=pd.DatetimeIndex([], tz="UTC", name="ts"))
+
+def _read_partition(path, start=None, end=None):
+    return read_table(path, start=start, end=end).set_index("ts")
+
+def _write_partition(df, path, float32=None):
+    # Атомарная фиксация внутри write_table: временный файл + os.replace
+    df_to_save = df.reset_index()
+    df_to_save["ts"] = pd.to_datetime(df_to_save["ts"], utc=True)
+    write_table(df_to_save, path, float32)
+
+def append_candles(store_path, df, float32=None, log_rewrites=True):
+    # Дописывает (upsert по ts) свечи в партиции их дней;
+    # float32=False — без CANDLE_FLOAT32 (цены и объёмы позиций);
+    # log_rewrites=False — не отмечать переписывания (уплотнение журналов)
+    if df.empty:
+        return
+    os.makedirs(store_path, exist_ok=True)
+    df = df.copy()
+    df.index = pd.to_datetime(df.index, utc=True)
+    df.index.name = "ts"
+    df = df[~df.index.duplicated(keep="last")].sort_index()
+
+    # Чтение-слияние-подмена партиции под блокировкой хранилища: сборщик,
+    # backfill.py и агрегаторы разных процессов не затирают минуты друг друга
+    with locked_file(_write_lock_path(store_path)):
+        previous_last = last_candle_ts(store_path)
+        # Дни пишем по возрастанию, чтобы последний ts в хранилище рос монотонно
+        for day, chunk in df.groupby(df.index.floor("D")):
+            path = _partition_path(store_path, day)
+            if os.path.exists(path):
+                existing = _read_partition(path)
+                chunk = pd.concat([existing, chunk])
+                chunk = chunk[~chunk.index.duplicated(keep="last")].sort_index()
+            _write_partition(chunk, path, float32)
+        if log_rewrites and previous_last is not None and df.index[0] < previous_last:
+            _record_rewrite(store_path, df.index[0])
+
+def _write_lock_path(store_path):
+    return os.path.join(store_path, WRITE_LOCK_FILE)
+
+def _rewrites_path(store_path):
+    return os.path.join(store_path, REWRITES_FILE)
+
+def _read_json(path):
+    with open(path) as f:
+        return json.load(f)
+
+def _record_rewrite(store_path, ts):
+    # Вызывается под блокировкой записи хранилища (append_candles)
+    path = _rewrites_path(store_path)
+    log = _read_json(path) if os.path.exists(path) else {"seq": 0, "entries": []}
+    log["seq"] += 1
+    log["entries"] = (log["entries"] + [[log["seq"], int(ts_to_ms(ts))]])[-MAX_REWRITES:]
+    tmp_file = path + ".tmp"
+    with open(tmp_file, "w") as f:
+        json.dump(log, f)
+    os.replace(tmp_file, path)
+
+def rewrite_seq(store_path):
+    # Номер последней переписывающей записи (0 — не было)
+    path = _rewrites_path(store_path)
+    return cached_read(path, _read_json)["seq"] if os.path.exists(path) else 0
+
+def rewritten_since(store_path, seq):
+    # Самый ранний ts, переписанный после записи номер seq; None — не было.
+    # Если нужные записи уже вытеснены из журнала — ts первого бара хранилища
+    path = _rewrites_path(store_path)
+    if not os.path.exists(path):
+        return None
+    log = cached_read(path, _read_json)
+    if log["seq"] <= seq:
+        return None
+    entries = [ts for entry_seq, ts in log["entries"] if entry_seq > seq]
+    if not log["entries"] or log["entries"][0][0] > seq + 1:
+        entries.append(int(ts_to_ms(first_candle_ts(store_path))))
+    return ms_to_ts([min(entries)])[0]
+
+def read_candles(store_path, start=None, end=None):
+    # Читает диапазон [start, end], не открывая партиции за его пределами
+    start = _to_utc(start) if start is not None else None
+    end = _to_utc(end) if end is not None else None
+    frames = []
+    for day, path in list_partitions(store_path):
+        if start is not None and day < start.floor("D"):
+            continue
+        if end is not None and day > end:
+            break
+        frames.append(_read_partition(path, start, end))
+    if not frames:
+        return _empty_frame()
+    return pd.concat(frames).sort_index()
+
+def read_last_candles(store_path, n):
+    # Последние n свечей: идём с конца и читаем только нужные партиции,
+    # из каждой — только хвост нужной длины
+    frames = []
+    rows = 0
+    for day, path in reversed(list_partitions(store_path)):
+        df = read_tail(path, n - rows).set_index("ts")
+        frames.append(df)
+        rows += len(df)
+        if rows >= n:
+            break
+    if not frames:
+        return _empty_frame()
+    return pd.concat(frames[::-1]).sort_index().tail(n)
+
+def first_candle_ts(store_path):
+    # По статистике ts в футере первой партиции, без чтения данных
+    for day, path in list_partitions(store_path):
+        first = ts_range(path)[0]
+        if first is not None:
+            return first
+    return None
+
+def last_candle_ts(store_path):
+    # По статистике ts в футере партиции, без чтения данных
+    partitions = list_partitions(store_path)
+    for day, path in reversed(partitions):
+        last = ts_range(path)[1]
+        if last is not None:
+            return last
+    return None
+
+def migrate_single_file(file_path, store_path):
+    # Разовый перенос старого {symbol}_1min.parquet в партиции
+    if not os.path.exists(file_path) or list_partitions(store_path):
+        return
+    df = pd.read_parquet(file_path)
+    if "ts" in df.columns:
+        df["ts"] = pd.to_datetime(df["ts"], utc=True)
+        df.set_index("ts", inplace=True)
+    append_candles(store_path, df)
+    os.replace(file_path, file_path + ".migrated")
+    print(f"📦 {file_path} перенесён в партиции {store_path} ({len(df)} строк)")
+
+def upgrade_store(store_path):
+    # Разовая перезапись партиций старого формата (ts datetime, snappy) в компактную схему
+    upgraded = 0
+    for day, path in list_partitions(store_path):
+        if not is_compact(path):
+            _write_partition(_read_partition(path), path)
+            upgraded += 1
+    if upgraded:
+        print(f"📦 {store_path}: {upgraded} партиций переписано в компактный формат")
+
+def migrate_bot_store(old_path, new_path):
+    # Перенос хранилища из strategy_data/<bot>/ в общее хранилище символа
+    if not os.path.isdir(old_path) or os.path.exists(new_path):
+        return
+    os.makedirs(os.path.dirname(new_path), exist_ok=True)
+    os.replace(old_path, new_path)
+    print(f"📦 {old_path} перенесён в {new_path}")
@@ -0,0 +1,159 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+from candle_collector import SymbolCollector
+from kline_stream import KlineStream
+from bybit_client import get_client
+
+# === Общий сборщик свечей для всех символов ===
+# Один процесс вместо «1 Формирование базы.py» на каждого бота: pandas и pybit
+# загружаются один раз, а все символы из accounts.json обновляются параллельно
+# в asyncio. REST-вызовы pybit синхронные, поэтому каждый символ обновляется
+# в пуле потоков; цикл следит, чтобы все символы уложились в UPDATE_DEADLINE.
+
+ACCOUNTS_FILE = "accounts.json"
+UPDATE_DEADLINE = 20       # сек после начала минуты на обновление всех символов
+STREAM_IDLE_TIMEOUT = 90   # сек без свечей символа в WebSocket — догружаем по REST
+REPAIR_INTERVAL = 60       # сек между проходами починки дыр в режиме ws
+
+
+def load_symbols():
+    # {(category, symbol): legacy_data_path} по ботам всех аккаунтов
+    with open(ACCOUNTS_FILE) as f:
+        accounts = json.load(f)
+    symbols = {}
+    for acc in accounts:
+        for bot_name in acc.get("bots", {}):
+            with open(os.path.join("configs", f"{bot_name}.json")) as f:
+                config = json.load(f)
+            key = (config.get("category", "linear"), config.get("symbol", "BTCUSDT").upper())
+            symbols.setdefault(key, os.path.join("strategy_data", bot_name))
+    return symbols
+
+def sync_to_next_minute(start_time):
+    elapsed = time.time() - start_time
+    delay = 60 - (elapsed % 60)
+    print(f"⏱️ Цикл завершён за {elapsed:.2f} сек. Ждём {delay:.2f} сек до следующего запуска.")
+    return delay
+
+
+async def update_all(collectors, running):
+    # Запускаем обновление всех символов сразу; символ, чьё прошлое обновление
+    # ещё не закончилось, пропускаем, чтобы не копить очередь
+    started = time.time()
+    tasks = {}
+    for collector in collectors:
+        previous = running.get(collector.symbol)
+        if previous is not None and not previous.done():
+            print(f"⚠️ [{collector.symbol}] прошлое обновление ещё идёт — пропуск")
+            continue
+        task = asyncio.ensure_future(asyncio.to_thread(collector.update))
+        running[collector.symbol] = task
+        tasks[task] = collector
+
+    if not tasks:
+        return
+    done, pending = await asyncio.wait(tasks.keys(), timeout=UPDATE_DEADLINE)
+    for task in done:
+        if task.exception() is not None:
+            print(f"❌ [{tasks[task].symbol}] ошибка обновления: {task.exception()}")
+    late = [tasks[task].symbol for task in pending]
+    print(f"✅ Обновлено символов {len(done)}/{len(tasks)} за {time.time() - started:.2f} сек"
+          + (f" | не уложились в {UPDATE_DEADLINE} сек: {', '.join(late)}" if late else ""))
+
+def _log_repair_error(collector):
+    def callback(task):
+        if not task.cancelled() and task.exception() is not None:
+            print(f"❌ [{collector.symbol}] ошибка починки дыр: {task.exception()}")
+    return callback
+
+def start_repairs(collectors, running):
+    # Починка дыр — в фоне после обновления; пока она идёт, следующее
+    # обновление символа пропускается, поэтому она ограничена REPAIR_BUDGET
+    for collector in collectors:
+        previous = running.get(collector.symbol)
+        if previous is not None and not previous.done():
+            continue
+        task = asyncio.ensure_future(asyncio.to_thread(collector.repair_gaps))
+        task.add_done_callback(_log_repair_error(collector))
+        running[collector.symbol] = task
+
+async def run_rest(collectors):
+    running = {}
+    while True:
+        start_time = time.time()
+        print(f"\n🕒 [{datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')}] 🔄 Обновление {len(collectors)} символов")
+        await update_all(collectors, running)
+        start_repairs(collectors, running)
+        get_client().maybe_report()
+        await asyncio.sleep(sync_to_next_minute(start_time))
+
+async def run_stream(collectors):
+    # Одно WebSocket-соединение на категорию, свечи раздаём сборщикам символов
+    by_category = {}
+    for collector in collectors:
+        by_category.setdefault(collector.category, {})[collector.symbol] = collector
+
+    await update_all(collectors, {})  # догоняем историю по REST, дальше — только поток
+    last_seen = {collector.symbol: time.time() for collector in collectors}
+
+    async def consume(category, symbol_collectors):
+        stream = KlineStream(list(symbol_collectors), category)
+        await asyncio.to_thread(stream.start)
+        while True:
+            item = await asyncio.to_thread(stream.get, 5)
+            if item is not None:
+                symbol, bars = item
+                if symbol in symbol_collectors:
+                    last_seen[symbol] = time.time()
+                    await asyncio.to_thread(symbol_collectors[symbol].on_bars, bars)
+            # Символы, по которым поток молчит, догоняем по REST
+            silent = [c for s, c in symbol_collectors.items() if time.time() - last_seen[s] > STREAM_IDLE_TIMEOUT]
+            if silent:
+                print(f"⚠️ {STREAM_IDLE_TIMEOUT} сек без свечей из WebSocket: {', '.join(c.symbol for c in silent)} — догружаем по REST")
+                for collector in silent:
+                    last_seen[collector.symbol] = time.time()
+                    await asyncio.to_thread(collector.update)
+
+    async def repair():
+        # Запись под write_lock сборщика, поэтому чинить можно параллельно с потоком
+        running = {}
+        while True:
+            start_repairs(collectors, running)
+            await asyncio.sleep(REPAIR_INTERVAL)
+
+    await asyncio.gather(repair(), *(consume(category, symbol_collectors)
+                                     for category, symbol_collectors in by_category.items()))
+
+async def main(mode):
+    symbols = load_symbols()
+    collectors = [SymbolCollector(symbol, category, legacy_data_path=legacy_path)
+                  for (category, symbol), legacy_path in symbols.items()]
+    print(f"🚀 Сборщик свечей: {', '.join(c.symbol for c in collectors)} | режим {mode}")
+
+    loop = asyncio.get_running_loop()
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=max(4, 2 * len(collectors))))
+    await asyncio.gather(*(asyncio.to_thread(c.start) for c in collectors))
+
+    if mode == "ws":
+        await run_stream(collectors)
+    else:
+        await run_rest(collectors)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mode", choices=["rest", "ws"], default="rest",
+                        help="rest — опрос раз в минуту, ws — поток kline через WebSocket")
+    args = parser.parse_args()
+    try:
+        asyncio.run(main(args.mode))
+    except KeyboardInterrupt:
+        print("🛑 Остановка сборщика.")
+        sys.exit(0)
@@ -0,0 +1,67 @@
+import os
+import mmap
+import time
+import struct
+
+# === Уведомление «новые данные зафиксированы» через общий счётчик в памяти ===
+# Писатель (сборщик свечей, подготовка признаков) после каждой записи
+# увеличивает счётчик в маленьком файле, отображённом в память (mmap), —
+# читатели видят изменение без системных вызовов и просыпаются сразу, а не
+# по часам. Работает одинаково на Linux и Windows.
+# Формат файла: seq (int64) и ts последней записи в мс (int64).
+
+LAYOUT = struct.Struct("<qq")
+POLL_INTERVAL = float(os.environ.get("COMMIT_POLL_INTERVAL", 0.05))  # сек между проверками счётчика
+
+
+def candle_commit_path(store_path):
+    return os.path.join(store_path, "commit.seq")
+
+
+class CommitCounter:
+    def __init__(self, path):
+        self.path = path
+        self.map = None
+        self.seen = self.read()[0]
+
+    def _open(self, create=False):
+        if self.map is not None:
+            return True
+        if create and not os.path.exists(self.path):
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            try:
+                with open(self.path, "xb") as f:
+                    f.write(bytes(LAYOUT.size))
+            except FileExistsError:
+                pass
+        if not os.path.exists(self.path):
+            return False
+        with open(self.path, "r+b") as f:
+            self.map = mmap.mmap(f.fileno(), LAYOUT.size)
+        return True
+
+    def read(self):
+        # (seq, ts_ms) последней записи; (0, 0), пока писатель не запускался
+        if not self._open():
+            return 0, 0
+        return LAYOUT.unpack_from(self.map, 0)
+
+    def publish(self, ts):
+        # Сначала ts, потом seq — читатель реагирует на смену seq
+        self._open(create=True)
+        seq, _ = LAYOUT.unpack_from(self.map, 0)
+        struct.pack_into("<q", self.map, 8, int(ts.timestamp() * 1000))
+        struct.pack_into("<q", self.map, 0, seq + 1)
+
+    def wait(self, timeout):
+        # Ждём новой записи не дольше timeout сек; True — если она была
+        deadline = time.monotonic() + timeout
+        while True:
+            seq = self.read()[0]
+            if seq != self.seen:
+                self.seen = seq
+                return True
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            time.sleep(min(POLL_INTERVAL, remaining))
@@ -0,0 +1,170 @@
+import os
+import json
+import time
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from candle_store import append_candles, list_partitions
+from parquet_schema import read_table, write_table
+from segment_journal import SegmentJournal, journal_commit_path
+
+# === Журнал состояний позиции (бывший executions.parquet) ===
+#   <journal>/segments/<seq>.parquet — каждая запись: один маленький сегмент
+#   <journal>/YYYY-MM-DD.parquet     — уплотнённые записи по дням (как в candle_store)
+# Журнал, уплотнение и чтение — segment_journal.py. Последняя запись — в
+# последнем сегменте (или в хвосте последней партиции сразу после уплотнения),
+# историю для неё читать не нужно.
+# Каждая запись увеличивает счётчик <journal>.seq — по нему торговля видит,
+# что появилась новая запись, и не перечитывает журнал без нужды.
+# Лестница ордеров (order_prices, order_sizes) хранится нативными колонками
+# list<float64>, а не строками json; explode_orders разворачивает её в таблицу
+# ордеров (ts, price, size) без разбора строк. Старые записи со строками
+# переписывает upgrade_executions.
+# Запись позиций сохраняет только изменения (и редкий heartbeat) —
+# ChangeRecorder, поэтому состояние на произвольный момент — as-of поиск
+# (executions_asof).
+
+SEGMENT_DIR = "segments"
+COMPACT_EVERY = int(os.environ.get("EXECUTIONS_COMPACT_EVERY", 60))
+LADDER_COLUMNS = ("order_prices", "order_sizes")
+
+
+_journals = {}
+
+def executions_commit_path(journal_path):
+    return journal_commit_path(journal_path)
+
+def _journal(journal_path):
+    # Журнал сегментов (segment_journal.py); цены и объёмы — без float32
+    if journal_path not in _journals:
+        _journals[journal_path] = SegmentJournal(journal_path, SEGMENT_DIR, COMPACT_EVERY, float32=False)
+    return _journals[journal_path]
+
+def list_segments(journal_path):
+    return _journal(journal_path).list_segments()
+
+def has_executions(journal_path):
+    return _journal(journal_path).has_data()
+
+def append_execution(journal_path, record):
+    # record — словарь с ts; новый сегмент, при накоплении — уплотнение
+    _journal(journal_path).append(pd.DataFrame([record]))
+
+def compact_executions(journal_path):
+    _journal(journal_path).compact()
+
+def read_executions(journal_path, start=None, end=None):
+    # Вся история (или [start, end]): партиции + сегменты поверх них
+    return _journal(journal_path).read(start=start, end=end)
+
+def executions_asof(journal_path, timestamps, lookback=pd.Timedelta(days=1)):
+    # Состояние позиции на каждый момент timestamps — последняя запись не позже
+    # него (журнал хранит только изменения и heartbeat). Раньше первого момента
+    # читаем не больше lookback; где записи нет — NaN (запись позиций не работала)
+    query = pd.DataFrame({"ts": pd.DatetimeIndex(pd.to_datetime(timestamps, utc=True)).as_unit("ms")})
+    query = query.sort_values("ts").reset_index(drop=True)
+    if query.empty:
+        return query.set_index("ts")
+    df = read_executions(journal_path, start=query["ts"].iloc[0] - lookback, end=query["ts"].iloc[-1])
+    if df.empty:
+        return query.set_index("ts")
+    df = df.rename(columns={"ts": "recorded_ts"})
+    df["recorded_ts"] = df["recorded_ts"].dt.as_unit("ms")
+    result = pd.merge_asof(query, df, left_on="ts", right_on="recorded_ts", direction="backward")
+    return result.set_index("ts")
+
+def position_record(position, orders):
+    # Поля записи журнала (без ts): position — size/avg_price/side/mark_price,
+    # orders — [(price, qty)] открытых ордеров
+    return {
+        "position_size": position["size"],
+        "avg_price": position["avg_price"],
+        "side": position["side"],
+        "mark_price": position["mark_price"],
+        "position_open": position["size"] > 0,
+        "order_count": len(orders),
+        "order_prices": [price for price, _ in orders],  # нативные списки, без json
+        "order_sizes": [qty for _, qty in orders],
+    }
+
+def record_key(record):
+    # Что считается изменением: позиция и набор ордеров (mark price — нет);
+    # порядок ордеров в ответе биржи не важен
+    return (record["position_size"], record["avg_price"], record["side"],
+            tuple(sorted(zip(record["order_prices"], record["order_sizes"]))))
+
+class ChangeRecorder:
+    # write(ts, record) — только при изменении record_key, без изменений —
+    # heartbeat раз в heartbeat_interval сек. Ошибка записи пробрасывается,
+    # и следующий offer пробует записать снова
+    def __init__(self, write, heartbeat_interval):
+        self.write = write
+        self.heartbeat_interval = heartbeat_interval
+        self.last_key = None
+        self.last_write = None
+
+    def next_heartbeat(self):
+        return (self.last_write or 0) + self.heartbeat_interval
+
+    def offer(self, ts, record, now=None):
+        now = time.time() if now is None else now
+        key = record_key(record)
+        if key == self.last_key and now < self.next_heartbeat():
+            return False
+        self.write(ts, record)
+        self.last_key, self.last_write = key, now
+        return True
+
+def read_last_execution(journal_path):
+    # Последняя запись (Series с ts) или None: последний сегмент, без истории
+    df = _journal(journal_path).read_last(1)
+    if df.empty:
+        return None
+    return df.iloc[-1].copy()
+
+def explode_orders(df):
+    # Записи журнала → таблица ордеров: по строке на ордер (ts, price, size)
+    if df.empty:
+        return pd.DataFrame({"ts": pd.Series(dtype="datetime64[ms, UTC]"), "price": [], "size": []})
+    counts = df["order_prices"].map(len).to_numpy()
+    return pd.DataFrame({
+        "ts": np.repeat(df["ts"].to_numpy(), counts),
+        "price": np.concatenate([np.asarray(v, dtype="float64") for v in df["order_prices"]]),
+        "size": np.concatenate([np.asarray(v, dtype="float64") for v in df["order_sizes"]]),
+    })
+
+def _decode_ladders(df):
+    # Строки json старого формата → списки
+    for column in LADDER_COLUMNS:
+        if column in df.columns:
+            df[column] = [json.loads(v) if isinstance(v, str) else v for v in df[column]]
+    return df
+
+def _has_json_ladders(path):
+    # pandas 3 пишет строки как large_string
+    schema = pq.read_schema(path)
+    types = [schema.field(column).type for column in LADDER_COLUMNS if column in schema.names]
+    return any(pa.types.is_string(t) or pa.types.is_large_string(t) for t in types)
+
+def upgrade_executions(journal_path):
+    # Разовая перезапись партиций и сегментов со строками json в списочные колонки
+    paths = [path for _, path in list_partitions(journal_path) + list_segments(journal_path)]
+    upgraded = 0
+    for path in paths:
+        if _has_json_ladders(path):
+            write_table(_decode_ladders(read_table(path)), path, float32=False)
+            upgraded += 1
+    if upgraded:
+        print(f"📦 {journal_path}: {upgraded} файлов переписано со списочными колонками ордеров")
+
+def migrate_executions_file(file_path, journal_path):
+    # Разовый перенос старого executions.parquet (индекс ts) в журнал
+    if not os.path.exists(file_path) or has_executions(journal_path):
+        return
+    df = _decode_ladders(pd.read_parquet(file_path))
+    df.index = pd.to_datetime(df.index, utc=True)
+    append_candles(journal_path, df, float32=False)
+    os.replace(file_path, file_path + ".migrated")
+    print(f"📦 {file_path} перенесён в журнал {journal_path} ({len(df)} записей)")
@@ -0,0 +1,94 @@
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+
+from candle_store import read_candles, list_partitions, last_candle_ts
+from indicator_engine import compute_indicators, warmup_bars
+from feature_spec import base_timeframe, group_by_timeframe, build_features
+from feature_store import rewrite_features_chunks, append_features
+
+# === Параллельный полный пересчёт признаков (FULL_REBUILD) ===
+# История режется на участки по CHUNK_DAYS дней, участки считаются в пуле
+# процессов. Каждый участок читает свечи с прогревом перед своим началом
+# (indicator_engine.warmup_bars) — индикаторы успевают сойтись с полным
+# проходом, а entry_trigger первой строки видит signal предыдущей.
+# Готовые участки по порядку сразу пишутся в хранилище признаков, поэтому в
+# памяти одновременно не больше нескольких участков на процесс.
+# recompute_features — то же с произвольного момента (свечи переписаны
+# починкой дыр): строки с него дописываются поверх старых.
+
+CHUNK_DAYS = int(os.environ.get("FEATURES_CHUNK_DAYS", 30))
+REBUILD_WORKERS = int(os.environ.get("FEATURES_REBUILD_WORKERS", 0)) or os.cpu_count()
+
+
+def warmup_span(spec):
+    # Сколько истории перед участком нужно по самому медленному таймфрейму
+    return max(pd.Timedelta(timeframe) * (warmup_bars(specs) + 1)
+               for timeframe, specs in group_by_timeframe(spec).items())
+
+def compute_chunk(task):
+    # Признаки строк базового таймфрейма с ts в [start, end); end=None — до конца
+    # истории, тогда последние бары хранилищ ещё формируются
+    stores, spec, start, end = task
+    base = base_timeframe(spec)
+    read_start = start - warmup_span(spec)
+    read_end = end - pd.Timedelta("1ms") if end is not None else None
+    frames = {}
+    for timeframe, specs in group_by_timeframe(spec).items():
+        bars = read_candles(stores[timeframe], start=read_start, end=read_end)
+        frames[timeframe] = bars.join(compute_indicators(bars, specs))
+
+    df = build_features(frames[base].reset_index(), frames, spec, forming=end is None)
+    return df[df["ts"] >= start].reset_index(drop=True)
+
+def chunk_bounds(store_path, chunk_days=CHUNK_DAYS):
+    # Границы участков по дням партиций базового хранилища
+    partitions = list_partitions(store_path)
+    if not partitions or last_candle_ts(store_path) is None:
+        return []
+    days = [day for day, _ in partitions]
+    starts = days[::chunk_days]
+    return list(zip(starts, starts[1:] + [None]))
+
+def _ordered_results(pool, tasks, workers):
+    # Участки по порядку; в работе и в очереди на запись — не больше двух на процесс
+    pending = deque()
+    for task in tasks:
+        pending.append(pool.submit(compute_chunk, task))
+        if len(pending) >= 2 * workers:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+def rebuild_features(store_path, stores, spec, workers=REBUILD_WORKERS):
+    # stores — {таймфрейм: путь хранилища свечей}; результат — в store_path
+    tasks = [(stores, spec, start, end) for start, end in chunk_bounds(stores[base_timeframe(spec)])]
+    if not tasks:
+        return 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        rows = rewrite_features_chunks(store_path, _ordered_results(pool, tasks, workers))
+    print(f"🧮 Признаки пересчитаны: {len(tasks)} участков по {CHUNK_DAYS} дн. в {workers} процессах, {rows} строк")
+    return rows
+
+def _append_chunks(store_path, chunks):
+    rows = 0
+    for df in chunks:
+        append_features(store_path, df)
+        rows += len(df)
+    return rows
+
+def recompute_features(store_path, stores, spec, start, workers=REBUILD_WORKERS):
+    # Пересчёт строк с ts >= start (до конца истории) поверх записанных;
+    # обычно это один последний участок — его считаем без пула процессов
+    tasks = [(stores, spec, max(chunk_start, start), end)
+             for chunk_start, end in chunk_bounds(stores[base_timeframe(spec)]) if end is None or end > start]
+    if len(tasks) == 1:
+        rows = _append_chunks(store_path, [compute_chunk(tasks[0])])
+    elif tasks:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            rows = _append_chunks(store_path, _ordered_results(pool, tasks, workers))
+    else:
+        return 0
+    print(f"🧮 Признаки пересчитаны с {start}: {len(tasks)} участков, {rows} строк")
+    return rows
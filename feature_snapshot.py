@@ -0,0 +1,104 @@
+import os
+import mmap
+import time
+import struct
+from datetime import datetime, timezone
+
+# === Последняя строка признаков в маленьком файле, отображённом в память ===
+# Подготовка признаков после каждой записи кладёт сюда последнюю строку,
+# торговля читает её за микросекунды — без parquet и pandas.
+# Формат файла <store>.latest:
+#   seq (int64) | число колонок (int32) | длина имён (int32) | имена через \n
+#   | ts последней строки в мс (int64) | значения колонок (float64)
+# Защита от чтения посреди записи — seqlock: писатель делает seq нечётным,
+# пишет строку и делает seq чётным; читатель повторяет чтение, если seq был
+# нечётным или изменился за время чтения. Номер версии строки — seq // 2.
+# Набор колонок поменялся — файл создаётся заново (старый помечается seq = -1,
+# читатели переоткрывают его), версия продолжает расти.
+
+HEADER = struct.Struct("<qii")
+SEQ = struct.Struct("<q")
+RETIRED = -1
+READ_TIMEOUT = 1.0  # сек
+
+
+def features_snapshot_path(store_path):
+    return store_path.rstrip(os.sep) + ".latest"
+
+
+class FeatureSnapshot:
+    def __init__(self, path):
+        self.path = path
+        self.map = None
+        self.names = self.values = self.offset = None
+
+    def _close(self):
+        if self.map is not None:
+            self.map.close()
+        self.map = self.names = self.values = self.offset = None
+
+    def _open(self):
+        if self.map is not None:
+            return True
+        if not os.path.exists(self.path):
+            return False
+        with open(self.path, "r+b") as f:
+            self.map = mmap.mmap(f.fileno(), 0)
+        _, count, names_size = HEADER.unpack_from(self.map, 0)
+        names = bytes(self.map[HEADER.size:HEADER.size + names_size]).decode()
+        self.names = names.split("\n") if names else []
+        self.values = struct.Struct(f"<q{count}d")
+        self.offset = HEADER.size + names_size
+        return True
+
+    def _create(self, names, seq):
+        encoded = "\n".join(names).encode()
+        data = bytearray(HEADER.size + len(encoded) + struct.calcsize(f"<q{len(names)}d"))
+        HEADER.pack_into(data, 0, seq, len(names), len(encoded))
+        data[HEADER.size:HEADER.size + len(encoded)] = encoded
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_file = self.path + ".tmp"
+        with open(tmp_file, "wb") as f:
+            f.write(data)
+        if self._open():
+            SEQ.pack_into(self.map, 0, RETIRED)
+        self._close()
+        os.replace(tmp_file, self.path)
+        self._open()
+
+    def publish(self, ts, row):
+        # row — {колонка: число}; ts — время строки (pandas/datetime)
+        names = list(row)
+        if not self._open() or self.names != names:
+            seq = SEQ.unpack_from(self.map, 0)[0] if self.map is not None else 0
+            self._create(names, max(seq, 0) + max(seq, 0) % 2)
+        seq = SEQ.unpack_from(self.map, 0)[0]
+        seq += seq % 2  # запись прервалась (сбой писателя) — продолжаем с чётного
+        SEQ.pack_into(self.map, 0, seq + 1)
+        self.values.pack_into(self.map, self.offset, int(ts.timestamp() * 1000), *(float(row[name]) for name in names))
+        SEQ.pack_into(self.map, 0, seq + 2)
+
+    def read(self):
+        # {"seq", "ts", колонки...} последней строки; None, пока её не публиковали
+        # (или если запись не завершилась за READ_TIMEOUT — писатель упал посреди неё)
+        deadline = time.monotonic() + READ_TIMEOUT
+        while True:
+            if not self._open():
+                return None
+            seq = SEQ.unpack_from(self.map, 0)[0]
+            if seq == RETIRED:
+                self._close()
+                continue
+            if seq == 0:
+                return None
+            if seq % 2:
+                if time.monotonic() > deadline:
+                    return None
+                time.sleep(0)
+                continue
+            ts_ms, *values = self.values.unpack_from(self.map, self.offset)
+            if SEQ.unpack_from(self.map, 0)[0] == seq:
+                break
+        row = {"seq": seq // 2, "ts": datetime.fromtimestamp(ts_ms / 1000, tz=timezone.utc)}
+        row.update(zip(self.names, values))
+        return row
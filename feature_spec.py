@@ -0,0 +1,101 @@
+import pandas as pd
+
+from indicator_engine import INDICATORS
+from timeframe_align import align_closed, completed_bars
+
+# === Описание признаков стратегии в configs/<bot>.json ===
+#   "features": [
+#     {"name": "rsi_5", "indicator": "rsi", "timeframe": "5min", "window": 14, "threshold": 46, "op": "<"},
+#     {"name": "atr_1h", "indicator": "atr", "timeframe": "1h", "window": 14, "threshold": 1.5, "op": "<"}
+#   ]
+# indicator — rsi / ema / atr / cci / bollinger (см. indicator_engine.INDICATORS).
+# Признак с threshold — фильтр входа: signal = 1, когда выполнены все фильтры.
+# Без threshold признак только считается и пишется в признаки.
+# Строки признаков — бары самого мелкого таймфрейма из описания.
+# Конфиги без "features" — прежние значения по умолчанию, с которыми торговал
+# процесс признаков (окна 14/30/20, пороги 44/55/100); старые ключи
+# rsi5_window/rsi5_threshold/... из BOT_PARAMS их переопределяют.
+# В configs/*.json записаны те же пороги.
+
+LEGACY_FEATURES = [
+    ("rsi_5", "rsi", "5min", "rsi5_window", 14, "rsi5_threshold", 44),
+    ("rsi_30", "rsi", "30min", "rsi30_window", 30, "rsi30_threshold", 55),
+    ("cci_1h", "cci", "1h", "cci_window", 20, "cci_threshold", 100),
+]
+OPERATORS = {
+    "<": lambda values, threshold: values < threshold,
+    ">": lambda values, threshold: values > threshold,
+}
+
+
+def _legacy_spec():
+    return [
+        {"name": name, "indicator": indicator, "timeframe": timeframe,
+         "window": window, "threshold": threshold, "op": "<"}
+        for name, indicator, timeframe, _, window, _, threshold in LEGACY_FEATURES
+    ]
+
+def load_feature_spec(config, params=None):
+    # Описание из конфига; BOT_PARAMS может переопределить его целиком ("features")
+    # или старыми ключами окон/порогов
+    params = params or {}
+    spec = params.get("features") or config.get("features") or _legacy_spec()
+    spec = [dict(feature) for feature in spec]
+    overrides = {name: (window_key, threshold_key) for name, _, _, window_key, _, threshold_key, _ in LEGACY_FEATURES}
+    for feature in spec:
+        window_key, threshold_key = overrides.get(feature["name"], (None, None))
+        if window_key in params:
+            feature["window"] = params[window_key]
+        if threshold_key in params:
+            feature["threshold"] = params[threshold_key]
+
+    for feature in spec:
+        if feature["indicator"] not in INDICATORS:
+            raise ValueError(f"Неизвестный индикатор {feature['indicator']} в признаке {feature['name']}")
+        if feature.get("op", "<") not in OPERATORS:
+            raise ValueError(f"Неизвестное сравнение {feature['op']} в признаке {feature['name']}")
+    return spec
+
+def base_timeframe(spec):
+    return min((f["timeframe"] for f in spec), key=pd.Timedelta)
+
+def group_by_timeframe(spec):
+    groups = {}
+    for feature in spec:
+        groups.setdefault(feature["timeframe"], []).append(feature)
+    return groups
+
+def feature_names(spec):
+    return [feature["name"] for feature in spec]
+
+def evaluate_signal(df, spec):
+    # 1, когда выполнены все фильтры с порогом
+    signal = pd.Series(True, index=df.index)
+    for feature in spec:
+        if "threshold" in feature:
+            signal &= OPERATORS[feature.get("op", "<")](df[feature["name"]], feature["threshold"])
+    return signal.astype(int)
+
+def build_features(df, frames, spec, prev_signal=None, forming=True):
+    # df — строки базового таймфрейма (колонка ts) с его индикаторами;
+    # frames — {таймфрейм: бары с колонками индикаторов}, последний бар каждого
+    # ещё формируется (forming=False — все бары закрыты, участок из середины
+    # истории). Одна функция и для живых признаков, и для оптимизатора.
+    # prev_signal — signal строки перед df (уже записанной), для entry_trigger
+    base = base_timeframe(spec)
+    df = df.reset_index(drop=True)
+    for timeframe, frame in frames.items():
+        if timeframe == base:
+            continue
+        names = [f["name"] for f in spec if f["timeframe"] == timeframe]
+        closed = completed_bars(frame[names]) if forming else frame[names]
+        aligned = align_closed(df["ts"], base, closed, timeframe)
+        for name in names:
+            df[name] = aligned[name].values
+
+    df["signal"] = evaluate_signal(df, spec)
+    previous = df["signal"].shift(1)
+    if prev_signal is not None and len(df):
+        previous.iloc[0] = prev_signal
+    df["entry_trigger"] = (previous == 0) & (df["signal"] == 1)
+    return df[df[feature_names(spec)].notna().all(axis=1)]
@@ -0,0 +1,100 @@
+import os
+import shutil
+
+from candle_store import append_candles
+from segment_journal import SegmentJournal, journal_commit_path
+from feature_snapshot import FeatureSnapshot, features_snapshot_path
+
+# === Хранилище признаков: журнал дельт + дневные партиции ===
+#   <store>/delta/<seq>.parquet   — каждая запись: только новые/изменённые строки
+#   <store>/YYYY-MM-DD.parquet    — уплотнённые данные (как в candle_store)
+# Журнал, уплотнение и чтение — segment_journal.py. Дельты пишутся по времени,
+# поэтому самые свежие строки — в последних дельтах.
+# Каждая запись увеличивает счётчик <store>.seq, по нему просыпается торговля,
+# и перед этим кладёт последнюю строку в <store>.latest (feature_snapshot.py).
+
+DELTA_DIR = "delta"
+COMPACT_EVERY = int(os.environ.get("FEATURES_COMPACT_EVERY", 60))
+
+
+_journals = {}
+_snapshots = {}
+
+def features_commit_path(store_path):
+    return journal_commit_path(store_path)
+
+def _publish_snapshot(store_path, df):
+    # Последняя строка — в снимок, до счётчика: проснувшаяся торговля уже видит её
+    last = df.iloc[df["ts"].to_numpy().argmax()]
+    path = features_snapshot_path(store_path)
+    if path not in _snapshots:
+        _snapshots[path] = FeatureSnapshot(path)
+    _snapshots[path].publish(last["ts"], last.drop("ts").to_dict())
+
+def _journal(store_path):
+    if store_path not in _journals:
+        _journals[store_path] = SegmentJournal(
+            store_path, DELTA_DIR, COMPACT_EVERY,
+            on_commit=lambda df: _publish_snapshot(store_path, df))
+    return _journals[store_path]
+
+def list_deltas(store_path):
+    return _journal(store_path).list_segments()
+
+def has_features(store_path):
+    return _journal(store_path).has_data()
+
+def append_features(store_path, df):
+    # Новая дельта со строками df (колонка ts); при накоплении — уплотнение
+    _journal(store_path).append(df)
+
+def compact_features(store_path):
+    _journal(store_path).compact()
+
+def read_features(store_path, start=None):
+    # Все признаки (или с start): партиции + дельты поверх них
+    return _journal(store_path).read(start=start)
+
+def read_last_features(store_path, n=1):
+    return _journal(store_path).read_last(n)
+
+def rewrite_features(store_path, df):
+    # Полная замена (FULL_REBUILD) одним кадром
+    rewrite_features_chunks(store_path, [df])
+
+def rewrite_features_chunks(store_path, chunks):
+    # Полная замена частями по времени (по возрастанию ts): каждая часть сразу
+    # пишется в партиции нового каталога, в памяти держится только она.
+    # Собираем рядом и подменяем каталог; возвращает число записанных строк
+    new_path = store_path.rstrip(os.sep) + ".new"
+    old_path = store_path.rstrip(os.sep) + ".old"
+    shutil.rmtree(new_path, ignore_errors=True)
+    last = None
+    rows = 0
+    for df in chunks:
+        if df.empty:
+            continue
+        append_candles(new_path, df.set_index("ts"))
+        last = df
+        rows += len(df)
+    if last is None:
+        return 0
+    if os.path.exists(store_path):
+        shutil.rmtree(old_path, ignore_errors=True)
+        os.replace(store_path, old_path)
+    os.replace(new_path, store_path)
+    shutil.rmtree(old_path, ignore_errors=True)
+    _journal(store_path).publish(last)
+    return rows
+
+def legacy_features_files(file_path):
+    # Старый features.parquet (или уже перенесённый в хранилище .migrated) считался
+    # по усечённой истории с формирующимися барами старших таймфреймов — такие
+    # признаки не переносим, а пересчитываем полностью
+    return [path for path in (file_path, file_path + ".migrated") if os.path.exists(path)]
+
+def retire_legacy_features(file_path):
+    # После полного пересчёта старые файлы больше не нужны для решения о пересчёте
+    for path in legacy_features_files(file_path):
+        os.replace(path, file_path + ".legacy")
+        print(f"📦 {path} заменён полным пересчётом признаков (сохранён как {file_path}.legacy)")
@@ -0,0 +1,34 @@
+from contextlib import contextmanager
+
+# === Межпроцессная блокировка через файл ===
+# Эксклюзивная блокировка открытого файла: flock на Linux, msvcrt на Windows.
+# locked_file(path) — открыть (создать) файл и держать блокировку на время блока.
+
+try:
+    import fcntl
+
+    def lock(f):
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+
+    def unlock(f):
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+except ImportError:  # Windows
+    import msvcrt
+
+    def lock(f):
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+
+    def unlock(f):
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+@contextmanager
+def locked_file(path, mode="a+"):
+    with open(path, mode) as f:
+        lock(f)
+        try:
+            yield f
+        finally:
+            unlock(f)
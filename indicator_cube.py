@@ -0,0 +1,104 @@
+import os
+import shutil
+import hashlib
+import numpy as np
+
+from candle_store import market_store_path, read_candles
+from indicator_engine import Intermediates, INDICATORS
+from feature_spec import base_timeframe, group_by_timeframe
+from timeframe_align import align_closed, completed_bars
+from parquet_schema import ts_to_ms
+
+# === Куб индикаторов для перебора параметров ===
+# Для каждого признака описания — колонки значений при разных окнах, уже
+# выровненные по закрытым строкам базового таймфрейма (как в признаках).
+# Лежат в .npy по колонке и открываются через mmap — перебор комбинаций окон
+# берёт готовые колонки без пересчёта, а процессы перебора делят страницы.
+#   <CUBE_ROOT>/<symbol>/<хэш свечей>/ts.npy, close.npy, <признак>_<окно>.npy
+# Хэш считается по самим свечам всех таймфреймов: новые или исправленные
+# свечи дают новый каталог, старые каталоги символа удаляются.
+# Недостающие окна досчитываются при запросе (один проход на таймфрейм).
+
+CUBE_ROOT = os.path.join("strategy_data", "cache", "cube")
+
+
+def _digest(candles):
+    h = hashlib.sha1()
+    for timeframe in sorted(candles):
+        bars = candles[timeframe]
+        h.update(timeframe.encode())
+        h.update(ts_to_ms(bars.index).astype("int64").tobytes())
+        h.update(np.ascontiguousarray(bars[["open", "high", "low", "close"]].to_numpy(dtype="float64")).tobytes())
+    return h.hexdigest()[:16]
+
+def _save(path, values):
+    # Атомарно: временный файл + os.replace
+    tmp_file = path + ".tmp.npy"
+    np.save(tmp_file, values)
+    os.replace(tmp_file, path)
+
+
+class IndicatorCube:
+    def __init__(self, symbol, category, spec, root=CUBE_ROOT):
+        self.spec = {feature["name"]: feature for feature in spec}
+        self.base = base_timeframe(spec)
+        self.candles = {timeframe: read_candles(market_store_path(symbol, category, timeframe))
+                        for timeframe in group_by_timeframe(spec)}
+        symbol_path = os.path.join(root, symbol.lower())
+        self.path = os.path.join(symbol_path, _digest(self.candles))
+        if not os.path.isdir(self.path):
+            shutil.rmtree(symbol_path, ignore_errors=True)
+            os.makedirs(self.path)
+            print(f"🧊 Новый куб индикаторов {self.path}")
+
+        # Строки — закрытые бары базового таймфрейма
+        rows = completed_bars(self.candles[self.base])
+        self.base_ts = rows.index
+        if not os.path.exists(self._column_path("ts")):
+            _save(self._column_path("ts"), ts_to_ms(rows.index).astype("int64"))
+            _save(self._column_path("close"), rows["close"].to_numpy(dtype="float64"))
+
+    def _column_path(self, key):
+        return os.path.join(self.path, f"{key}.npy")
+
+    def _load(self, key):
+        return np.load(self._column_path(key), mmap_mode="r")
+
+    @property
+    def ts(self):
+        return self._load("ts")
+
+    @property
+    def close(self):
+        return self._load("close")
+
+    def prepare(self, windows):
+        # windows — {признак: [окна]}; считаем только отсутствующие колонки,
+        # промежуточные величины таймфрейма — один раз на все окна
+        missing = {}
+        for name, values in windows.items():
+            feature = self.spec[name]
+            for window in values:
+                if not os.path.exists(self._column_path(f"{name}_{window}")):
+                    missing.setdefault(feature["timeframe"], []).append(dict(feature, window=window))
+        for timeframe, specs in missing.items():
+            bars = self.candles[timeframe]
+            inter = Intermediates(bars)
+            if timeframe != self.base:
+                bars = completed_bars(bars)
+            for spec in specs:
+                values = INDICATORS[spec["indicator"]](spec).batch(inter)
+                if timeframe == self.base:
+                    column = values[:len(self.base_ts)]
+                else:
+                    frame = bars[[]].assign(value=values[:len(bars)])
+                    column = align_closed(self.base_ts, self.base, frame, timeframe)["value"].to_numpy()
+                _save(self._column_path(f"{spec['name']}_{spec['window']}"), column.astype("float64"))
+            print(f"🧊 {timeframe}: посчитано колонок {len(specs)}")
+
+    def column(self, name, window):
+        # Значения признака name при окне window по строкам куба (mmap, только чтение)
+        key = f"{name}_{window}"
+        if not os.path.exists(self._column_path(key)):
+            self.prepare({name: [window]})
+        return self._load(key)
@@ -0,0 +1,450 @@
+import os
+import json
+import math
+import hashlib
+from collections import deque
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from candle_store import list_partitions, read_candles, first_candle_ts, rewrite_seq, rewritten_since
+
+# === Инкрементальные индикаторы таймфрейма с сохраняемым состоянием ===
+# Все индикаторы одного таймфрейма считаются вместе: бары читаются один раз,
+# общие промежуточные величины (разность close, типичная цена, true range,
+# EMA и средние по окнам) считаются один раз и переиспользуются индикаторами.
+# Полный пересчёт — один векторный проход NumPy/pandas по всей истории;
+# дальше состояние (средние Уайлдера, EMA, окна значений) обновляется на
+# каждый новый бар за O(1) и сохраняется в JSON — после перезапуска расчёт
+# продолжается с места остановки.
+# Формулы и порядок операций одинаковы в обоих путях (ewm adjust=False как в
+# pandas, средние по окну через np.mean), поэтому инкрементальные значения
+# совпадают с полным пересчётом бит в бит.
+# Последний бар хранилища ещё открыт (агрегатор перезаписывает его каждую
+# минуту), поэтому в состояние попадают только бары до него, а значение
+# последнего бара считается заново при каждом обновлении.
+
+
+def _ewm_step(weighted, value, alpha):
+    # Ровно как pandas ewm(adjust=False): ((1-a)*w + a*x) / ((1-a) + a)
+    if weighted is None:
+        return value
+    if weighted == value:
+        return weighted
+    old_wt = 1 - alpha
+    return (old_wt * weighted + alpha * value) / (old_wt + alpha)
+
+
+class Intermediates:
+    # Общие величины по всем барам таймфрейма, считаются по требованию один раз
+    def __init__(self, bars):
+        self.high = bars["high"].to_numpy(dtype="float64")
+        self.low = bars["low"].to_numpy(dtype="float64")
+        self.cache = {"close": bars["close"].to_numpy(dtype="float64")}
+
+    def _get(self, key, compute):
+        if key not in self.cache:
+            self.cache[key] = compute()
+        return self.cache[key]
+
+    def series(self, name):
+        # close, diff, up, down, typical, true_range
+        if name not in self.cache:
+            self.cache[name] = getattr(self, f"_{name}")()
+        return self.cache[name]
+
+    def _diff(self):
+        return np.concatenate(([np.nan], np.diff(self.series("close"))))
+
+    def _up(self):
+        diff = self.series("diff")
+        return np.where(diff > 0, diff, 0.0)
+
+    def _down(self):
+        diff = self.series("diff")
+        return np.where(diff < 0, -diff, 0.0)
+
+    def _typical(self):
+        return (self.high + self.low + self.series("close")) / 3.0
+
+    def _true_range(self):
+        prev_close = np.concatenate(([np.nan], self.series("close")[:-1]))
+        return np.fmax(self.high - self.low, np.fmax(np.abs(self.high - prev_close), np.abs(self.low - prev_close)))
+
+    def ewm(self, name, alpha):
+        return self._get(("ewm", name, alpha),
+                         lambda: pd.Series(self.series(name)).ewm(alpha=alpha, adjust=False).mean().to_numpy())
+
+    def window(self, name, window):
+        # Скользящие окна (строка на каждый бар, начиная с window-1)
+        return sliding_window_view(self.series(name), window)
+
+    def window_mean(self, name, window):
+        return self._get(("mean", name, window), lambda: self.window(name, window).mean(axis=1))
+
+
+def bar_intermediates(bar, prev_close):
+    # Те же величины для одного бара — в инкрементальном пути
+    close, high, low = bar["close"], bar["high"], bar["low"]
+    diff = close - prev_close if prev_close is not None else math.nan
+    if prev_close is None:
+        true_range = high - low
+    else:
+        true_range = max(high - low, abs(high - prev_close), abs(low - prev_close))
+    return {
+        "close": close,
+        "up": diff if diff > 0 else 0.0,
+        "down": -diff if diff < 0 else 0.0,
+        "typical": (high + low + close) / 3.0,
+        "true_range": true_range,
+    }
+
+
+# === Индикаторы ===
+# batch(inter) — значения по всем барам векторно; state_at(inter, k) — состояние
+# после бара k; update(bar) — шаг на один бар; value(bar) — значение по состоянию
+
+def _warmup(values, window):
+    values[:window - 1] = np.nan
+    return values
+
+EWM_TOLERANCE = 2.0 ** -106
+
+def _ewm_warmup(window, alpha):
+    # Вклад начального значения EWM убывает как (1 - alpha)^n. При 2^-53
+    # (точность float64) остаются расхождения в последнем бите, с запасом до
+    # 2^-106 счёт с середины истории совпадает с полным проходом бит в бит
+    return window + math.ceil(math.log(EWM_TOLERANCE) / math.log(1 - alpha))
+
+
+class RSI:
+    def __init__(self, spec):
+        self.window = spec["window"]
+        self.alpha = 1 / self.window
+        self.state = {"avg_up": None, "avg_down": None, "count": 0}
+
+    def _rsi(self, avg_up, avg_down):
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(avg_down == 0, 100.0, 100 - (100 / (1 + avg_up / avg_down)))
+
+    def warmup(self):
+        return _ewm_warmup(self.window, self.alpha)
+
+    def batch(self, inter):
+        return _warmup(self._rsi(inter.ewm("up", self.alpha), inter.ewm("down", self.alpha)), self.window)
+
+    def state_at(self, inter, k):
+        return {"avg_up": float(inter.ewm("up", self.alpha)[k]),
+                "avg_down": float(inter.ewm("down", self.alpha)[k]), "count": k + 1}
+
+    def update(self, bar):
+        self.state["avg_up"] = _ewm_step(self.state["avg_up"], bar["up"], self.alpha)
+        self.state["avg_down"] = _ewm_step(self.state["avg_down"], bar["down"], self.alpha)
+        self.state["count"] += 1
+
+    def value(self, bar):
+        if self.state["count"] < self.window:
+            return math.nan
+        return float(self._rsi(self.state["avg_up"], self.state["avg_down"]))
+
+
+class EMA:
+    # Отклонение close от EMA: close / ema - 1
+    def __init__(self, spec):
+        self.window = spec["window"]
+        self.alpha = 2 / (self.window + 1)
+        self.state = {"ema": None, "count": 0}
+
+    def warmup(self):
+        return _ewm_warmup(self.window, self.alpha)
+
+    def batch(self, inter):
+        return _warmup(inter.series("close") / inter.ewm("close", self.alpha) - 1, self.window)
+
+    def state_at(self, inter, k):
+        return {"ema": float(inter.ewm("close", self.alpha)[k]), "count": k + 1}
+
+    def update(self, bar):
+        self.state["ema"] = _ewm_step(self.state["ema"], bar["close"], self.alpha)
+        self.state["count"] += 1
+
+    def value(self, bar):
+        if self.state["count"] < self.window:
+            return math.nan
+        return bar["close"] / self.state["ema"] - 1
+
+
+class ATR:
+    # ATR Уайлдера в процентах от close — порог не зависит от цены символа
+    def __init__(self, spec):
+        self.window = spec["window"]
+        self.alpha = 1 / self.window
+        self.state = {"atr": None, "count": 0}
+
+    def warmup(self):
+        return _ewm_warmup(self.window, self.alpha)
+
+    def batch(self, inter):
+        return _warmup(inter.ewm("true_range", self.alpha) / inter.series("close") * 100, self.window)
+
+    def state_at(self, inter, k):
+        return {"atr": float(inter.ewm("true_range", self.alpha)[k]), "count": k + 1}
+
+    def update(self, bar):
+        self.state["atr"] = _ewm_step(self.state["atr"], bar["true_range"], self.alpha)
+        self.state["count"] += 1
+
+    def value(self, bar):
+        if self.state["count"] < self.window:
+            return math.nan
+        return self.state["atr"] / bar["close"] * 100
+
+
+class WindowIndicator:
+    # Индикатор по последним window значениям ряда source
+    source = None
+
+    def __init__(self, spec):
+        self.spec = spec
+        self.window = spec["window"]
+        self.state = {"values": deque(maxlen=self.window)}
+
+    def warmup(self):
+        return self.window + 1
+
+    def batch(self, inter):
+        result = np.full(len(inter.series("close")), np.nan)
+        if len(result) >= self.window:
+            view = inter.window(self.source, self.window)
+            result[self.window - 1:] = self.compute(view, inter.window_mean(self.source, self.window))
+        return result
+
+    def state_at(self, inter, k):
+        return {"values": inter.series(self.source)[max(0, k + 1 - self.window):k + 1].tolist()}
+
+    def update(self, bar):
+        self.state["values"].append(bar[self.source])
+
+    def value(self, bar):
+        if len(self.state["values"]) < self.window:
+            return math.nan
+        view = np.array(self.state["values"])[None, :]
+        return float(self.compute(view, view.mean(axis=1))[0])
+
+
+class CCI(WindowIndicator):
+    source = "typical"
+    CONSTANT = 0.015
+
+    def compute(self, view, mean):
+        mad = np.mean(np.abs(view - mean[:, None]), axis=1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return (view[:, -1] - mean) / (self.CONSTANT * mad)
+
+
+class Bollinger(WindowIndicator):
+    # Положение close в полосах Боллинджера (%b): 0 — нижняя полоса, 1 — верхняя
+    source = "close"
+
+    def compute(self, view, mean):
+        num_std = self.spec.get("num_std", 2)
+        std = view.std(axis=1)
+        lower = mean - num_std * std
+        width = 2 * num_std * std
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(width > 0, (view[:, -1] - lower) / width, 0.5)
+
+
+INDICATORS = {
+    "rsi": RSI,
+    "ema": EMA,
+    "atr": ATR,
+    "cci": CCI,
+    "bollinger": Bollinger,
+}
+
+
+def compute_indicators(bars, specs):
+    # Без состояния: один векторный проход по барам (бэктест, оптимизатор)
+    inter = Intermediates(bars)
+    return pd.DataFrame({spec["name"]: INDICATORS[spec["indicator"]](spec).batch(inter) for spec in specs},
+                        index=bars.index)
+
+
+def warmup_bars(specs):
+    # Сколько баров перед участком истории нужно для тех же значений, что у полного прохода
+    return max(INDICATORS[spec["indicator"]](spec).warmup() for spec in specs)
+
+
+def _dump_state(indicator):
+    return {k: list(v) if isinstance(v, deque) else v for k, v in indicator.state.items()}
+
+def _load_state(indicator, state):
+    for key, value in state.items():
+        if isinstance(indicator.state[key], deque):
+            value = deque(value, maxlen=indicator.window)
+        indicator.state[key] = value
+
+
+class TimeframeIndicators:
+    def __init__(self, store_path, specs, state_dir):
+        self.store_path = store_path
+        self.specs = specs
+        os.makedirs(state_dir, exist_ok=True)
+        # Хэш параметров в имени файла — смена окон начинает состояние с нуля;
+        # пороги на состояние не влияют
+        params = json.dumps([{k: v for k, v in spec.items() if k not in ("threshold", "op")}
+                             for spec in specs], sort_keys=True)
+        digest = hashlib.sha1(params.encode()).hexdigest()[:10]
+        self.state_path = os.path.join(state_dir, f"{specs[0]['timeframe']}_{digest}.json")
+        self.first_seen = None  # (номер переписываний, первая партиция, её первый ts)
+        self.reset()
+        self._load()
+
+    def _new_indicators(self):
+        return {spec["name"]: INDICATORS[spec["indicator"]](spec) for spec in self.specs}
+
+    def reset(self):
+        self.indicators = self._new_indicators()
+        self.first_ts = self.last_ts = self.last_bar = self.prev_close = None
+        self.last_values = {}
+        # Номер переписывающей записи хранилища (candle_store.rewrite_seq), до которой всё учтено
+        self.rewrite_seq = rewrite_seq(self.store_path)
+
+    def _load(self):
+        if not os.path.exists(self.state_path):
+            return
+        with open(self.state_path) as f:
+            saved = json.load(f)
+        for name, indicator in self.indicators.items():
+            _load_state(indicator, saved["states"][name])
+        self.first_ts = pd.Timestamp(saved["first_ts"])
+        self.last_ts = pd.Timestamp(saved["last_ts"])
+        self.last_bar = saved["last_bar"]
+        self.prev_close = saved["prev_close"]
+        self.last_values = {k: math.nan if v is None else v for k, v in saved["last_values"].items()}
+        # Состояние без номера (до журнала переписываний) — считаем учтённым всё, что было
+        self.rewrite_seq = saved.get("rewrite_seq", self.rewrite_seq)
+
+    def _save(self):
+        if self.last_ts is None:
+            return
+        saved = {
+            "states": {name: _dump_state(indicator) for name, indicator in self.indicators.items()},
+            "first_ts": self.first_ts.isoformat(),
+            "last_ts": self.last_ts.isoformat(),
+            "last_bar": self.last_bar,
+            "prev_close": self.prev_close,
+            "last_values": {k: None if math.isnan(v) else v for k, v in self.last_values.items()},
+            "rewrite_seq": self.rewrite_seq,
+        }
+        tmp_file = self.state_path + ".tmp"
+        with open(tmp_file, "w") as f:
+            json.dump(saved, f)
+        os.replace(tmp_file, self.state_path)
+
+    def _store_first_ts(self):
+        # Первый бар хранилища по статистике футера. Догрузка начала истории —
+        # переписывающая запись, поэтому пока номер переписываний и первая
+        # партиция те же, футер не открываем
+        partitions = list_partitions(self.store_path)
+        key = (rewrite_seq(self.store_path), partitions[0][1] if partitions else None)
+        if self.first_seen is None or self.first_seen[:2] != key:
+            self.first_seen = key + (first_candle_ts(self.store_path),)
+        return self.first_seen[2]
+
+    def pending_rewrite(self):
+        # Самый ранний бар уже учтённой истории (не позже last_ts), переписанный
+        # после состояния (починка дыр), или None
+        if self.last_ts is None:
+            return None
+        earliest = rewritten_since(self.store_path, self.rewrite_seq)
+        return earliest if earliest is not None and earliest <= self.last_ts else None
+
+    def _is_stale(self, bars):
+        # История изменилась под состоянием: догружено начало, переписан бар
+        # внутри учтённой истории или последний учтённый бар — тогда пересчитываем
+        # с нуля (подготовка признаков обычно успевает раньше — через pending_rewrite и seed)
+        if self._store_first_ts() != self.first_ts or self.pending_rewrite() is not None:
+            return True
+        if bars.empty or bars.index[0] != self.last_ts:
+            return True
+        committed = bars.iloc[0]
+        return any(committed[k] != v for k, v in self.last_bar.items())
+
+    def _batch(self, bars):
+        # Один векторный проход по всем барам; состояние — на последнем закрытом баре
+        inter = Intermediates(bars)
+        values = {name: indicator.batch(inter) for name, indicator in self.indicators.items()}
+        self.first_ts = bars.index[0]
+        if len(bars) >= 2:
+            k = len(bars) - 2
+            for name, indicator in self.indicators.items():
+                _load_state(indicator, indicator.state_at(inter, k))
+                self.last_values[name] = float(values[name][k])
+            self.last_ts = bars.index[k]
+            self.last_bar = dict(zip(bars.columns, bars.iloc[k].tolist()))
+            self.prev_close = float(inter.series("close")[k])
+        return pd.DataFrame(values, index=bars.index)
+
+    def _incremental(self, bars):
+        # Первая строка — уже учтённый бар, его значения берём из состояния
+        values = {name: [self.last_values.get(name, math.nan)] for name in self.indicators}
+        columns = list(bars.columns)
+        rows = bars.to_numpy()
+        for i in range(1, len(rows) - 1):
+            bar = dict(zip(columns, rows[i].tolist()))
+            shared = bar_intermediates(bar, self.prev_close)
+            for name, indicator in self.indicators.items():
+                indicator.update(shared)
+                self.last_values[name] = indicator.value(shared)
+                values[name].append(self.last_values[name])
+            self.prev_close = bar["close"]
+            self.last_ts = bars.index[i]
+            self.last_bar = bar
+
+        # Открытый бар — на копии состояния, без фиксации
+        if len(rows) > 1:
+            shared = bar_intermediates(dict(zip(columns, rows[-1].tolist())), self.prev_close)
+            for name, indicator in self._new_indicators().items():
+                _load_state(indicator, _dump_state(self.indicators[name]))
+                indicator.update(shared)
+                values[name].append(indicator.value(shared))
+        return pd.DataFrame(values, index=bars.index)
+
+    def update(self):
+        # Бары от последнего учтённого (включительно) до открытого с колонками
+        # индикаторов; в состояние уходят только закрытые бары.
+        # Номер переписываний — до чтения: то, что перепишут во время расчёта, увидим в следующий раз
+        seq = rewrite_seq(self.store_path)
+        if self.last_ts is not None:
+            bars = read_candles(self.store_path, start=self.last_ts)
+            if self._is_stale(bars):
+                print(f"♻️ {self.state_path}: история изменилась — пересчёт с начала")
+                self.reset()
+        if self.last_ts is None:
+            bars = read_candles(self.store_path)
+            if bars.empty:
+                return bars.assign(**{name: pd.Series(dtype=float) for name in self.indicators})
+            values = self._batch(bars)
+        else:
+            values = self._incremental(bars)
+        self.rewrite_seq = seq
+        self._save()
+        return bars.join(values)
+
+    def seed(self, start):
+        # Состояние по хвосту истории с start (после параллельного пересчёта
+        # признаков), не загружая всю историю; переписывания до этого момента учтены
+        self.reset()
+        bars = read_candles(self.store_path, start=start)
+        if bars.empty:
+            return
+        self._batch(bars)
+        self.first_ts = self._store_first_ts()
+        self._save()
+
+    def rebuild(self):
+        # Полный пересчёт по всей истории хранилища (FULL_REBUILD)
+        self.reset()
+        return self.update()
@@ -0,0 +1,75 @@
+import os
+import queue
+import pandas as pd
+from pybit.unified_trading import WebSocket
+
+# === Поток закрытых свечей через публичный WebSocket Bybit (kline.<interval>.<symbol>) ===
+# Колбэк pybit работает в потоке веб-сокета, поэтому закрытые свечи (confirm=true)
+# складываются в очередь парами (symbol, bars), а запись в хранилище делает
+# основной цикл сборщика. Одно соединение обслуживает все символы категории.
+# BYBIT_WS_PUBLIC_URL позволяет направить поток на локальный фейковый сервер
+# (tests/fake_bybit_ws.py, проверка — tests/test_kline_stream.py).
+
+PUBLIC_WS_URL = os.environ.get("BYBIT_WS_PUBLIC_URL")
+
+
+class PublicWebSocket(WebSocket):
+    # pybit сам собирает адрес биржи — подменяем его при подключении и переподключении
+    def __init__(self, channel_type, url=None, **kwargs):
+        self._url_override = url
+        super().__init__(channel_type, **kwargs)
+
+    def _connect(self, url):
+        super()._connect(self._url_override or url)
+
+
+def parse_kline_message(message):
+    # Из сообщения kline берём только закрытые свечи
+    rows = [
+        {
+            "ts": pd.to_datetime(int(k["start"]), unit="ms", utc=True),
+            "open": float(k["open"]),
+            "high": float(k["high"]),
+            "low": float(k["low"]),
+            "close": float(k["close"]),
+            "volume": float(k["volume"]),
+        }
+        for k in message.get("data", [])
+        if k.get("confirm")
+    ]
+    if not rows:
+        return pd.DataFrame()
+    return pd.DataFrame(rows).set_index("ts").sort_index()
+
+
+class KlineStream:
+    def __init__(self, symbols, category="linear", interval=1, url=PUBLIC_WS_URL):
+        self.symbols = [symbols] if isinstance(symbols, str) else list(symbols)
+        self.category = category
+        self.interval = interval
+        self.url = url
+        self.queue = queue.Queue()
+        self.ws = None
+
+    def start(self):
+        # retries=0 — pybit переподключается бесконечно, подписки восстанавливает сам
+        self.ws = PublicWebSocket(channel_type=self.category, url=self.url, testnet=False, retries=0)
+        self.ws.kline_stream(interval=self.interval, symbol=self.symbols, callback=self._on_message)
+        print(f"🔌 WebSocket kline.{self.interval}.{','.join(self.symbols)} подключён ({self.ws.endpoint})")
+
+    def _on_message(self, message):
+        bars = parse_kline_message(message)
+        if not bars.empty:
+            symbol = message.get("topic", "").split(".")[-1]
+            self.queue.put((symbol, bars))
+
+    def get(self, timeout=None):
+        # Следующая пара (symbol, закрытые свечи) или None, если за timeout ничего не пришло
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def stop(self):
+        if self.ws is not None:
+            self.ws.exit()
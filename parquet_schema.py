@@ -0,0 +1,144 @@
+import os
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# === Компактная схема parquet-файлов свечей и признаков ===
+# ts хранится как int64 — миллисекунды эпохи UTC (ключ сортировки), а не
+# timestamp с таймзоной: при чтении это простое приведение типа без разбора дат.
+# Значения — float64 или, по CANDLE_FLOAT32=1, float32 (вдвое меньше места;
+# точности float32 хватает цене, но не объёмам крупных монет — поэтому опция).
+# Сжатие zstd, группы строк по ROW_GROUP_SIZE — у каждой своя статистика ts.
+# Файлы старого формата (ts как datetime) читаются как раньше и переписываются
+# в новый формат при первой записи.
+# Хвост и диапазон читаются только по нужным группам строк: хвост — с конца
+# файла (read_tail), первый/последний ts — по min/max в футере без чтения
+# данных (ts_range), фильтры read_table pyarrow отсекает по той же статистике.
+# Списки (лестница ордеров в журнале позиций) — нативные колонки list<float64>.
+
+TS_COLUMN = "ts"
+COMPRESSION = "zstd"
+COMPRESSION_LEVEL = int(os.environ.get("PARQUET_ZSTD_LEVEL", 3))
+ROW_GROUP_SIZE = int(os.environ.get("PARQUET_ROW_GROUP_SIZE", 1440))
+FLOAT32 = os.environ.get("CANDLE_FLOAT32", "0") == "1"
+LIST_TYPE = pa.list_(pa.float64())
+
+
+def ts_to_ms(value):
+    # Timestamp / DatetimeIndex / Series → миллисекунды эпохи (int64)
+    if isinstance(value, (pd.Series, pd.Index, np.ndarray, list)):
+        return pd.DatetimeIndex(pd.to_datetime(value, utc=True)).as_unit("ms").asi8
+    ts = pd.Timestamp(value)
+    ts = ts.tz_localize("UTC") if ts.tzinfo is None else ts.tz_convert("UTC")
+    return ts.value // 1_000_000
+
+def ms_to_ts(values):
+    return pd.to_datetime(np.asarray(values, dtype="int64"), unit="ms", utc=True)
+
+def is_compact(path):
+    # По футеру файла: ts уже int64 или ещё старый datetime
+    return pa.types.is_integer(pq.read_schema(path).field(TS_COLUMN).type)
+
+def to_storage(df, float32=None):
+    # Колонка ts (datetime) → int64 мс; float-колонки при необходимости → float32
+    float32 = FLOAT32 if float32 is None else float32
+    df = df.copy()
+    df[TS_COLUMN] = ts_to_ms(df[TS_COLUMN])
+    if float32:
+        float_columns = df.select_dtypes(include="float64").columns
+        df[float_columns] = df[float_columns].astype("float32")
+    return df
+
+def from_storage(df):
+    # int64 мс → datetime UTC; старые файлы с datetime только нормализуем к UTC
+    if pd.api.types.is_integer_dtype(df[TS_COLUMN]):
+        df[TS_COLUMN] = ms_to_ts(df[TS_COLUMN].values)
+    else:
+        df[TS_COLUMN] = pd.to_datetime(df[TS_COLUMN], utc=True)
+    return df
+
+def _cast_lists(table):
+    # Пустые списки pyarrow выводит как list<null>, целые — как list<int64>:
+    # приводим все списочные колонки к одному типу, чтобы файлы склеивались
+    for i, field in enumerate(table.schema):
+        if pa.types.is_list(field.type) and field.type != LIST_TYPE:
+            table = table.set_column(i, field.name, table.column(i).cast(LIST_TYPE))
+    return table
+
+def write_table(df, path, float32=None):
+    # Атомарная запись: временный файл + os.replace
+    table = _cast_lists(pa.Table.from_pandas(to_storage(df, float32), preserve_index=False))
+    tmp_file = path + ".tmp"
+    pq.write_table(table, tmp_file, compression=COMPRESSION, compression_level=COMPRESSION_LEVEL,
+                   row_group_size=ROW_GROUP_SIZE)
+    os.replace(tmp_file, path)
+
+def _frame(table):
+    # Файлы, записанные pandas с индексом ts, читаем так же — ts колонкой
+    df = table.to_pandas(ignore_metadata=True)
+    if "__index_level_0__" in df.columns:
+        df = df.rename(columns={"__index_level_0__": TS_COLUMN})
+    return df
+
+def _ts_stats(metadata):
+    # [(min, max) ts] по группам строк из футера; None у группы без статистики
+    names = [metadata.schema.column(i).path for i in range(metadata.num_columns)]
+    if TS_COLUMN not in names:
+        return [None] * metadata.num_row_groups
+    index = names.index(TS_COLUMN)
+    result = []
+    for group in range(metadata.num_row_groups):
+        stats = metadata.row_group(group).column(index).statistics
+        result.append((stats.min, stats.max) if stats is not None and stats.has_min_max else None)
+    return result
+
+def _stat_to_ts(value):
+    # Статистика ts: int64 мс (компактные файлы) или datetime (старые, pandas)
+    if isinstance(value, (int, np.integer)):
+        return ms_to_ts([value])[0]
+    ts = pd.Timestamp(value)
+    return ts.tz_localize("UTC") if ts.tzinfo is None else ts.tz_convert("UTC")
+
+def ts_range(path):
+    # (первый, последний) ts файла по статистике групп, без чтения данных
+    metadata = pq.ParquetFile(path).metadata
+    if metadata.num_rows == 0:
+        return None, None
+    stats = [s for s in _ts_stats(metadata) if s is not None]
+    if not stats:
+        df = read_table(path, columns=[TS_COLUMN])
+        return (df[TS_COLUMN].min(), df[TS_COLUMN].max()) if not df.empty else (None, None)
+    return _stat_to_ts(min(s[0] for s in stats)), _stat_to_ts(max(s[1] for s in stats))
+
+def read_tail(path, n, columns=None):
+    # Последние n строк: файлы пишутся по возрастанию ts, поэтому читаем
+    # группы строк с конца, пока не наберётся n, — остальные не открываем
+    parquet_file = pq.ParquetFile(path)
+    metadata = parquet_file.metadata
+    selected = []
+    rows = 0
+    for group in reversed(range(metadata.num_row_groups)):
+        selected.insert(0, group)
+        rows += metadata.row_group(group).num_rows
+        if rows >= n:
+            break
+    if columns is not None and TS_COLUMN not in columns:
+        columns = [TS_COLUMN] + list(columns)
+    df = _frame(parquet_file.read_row_groups(selected, columns=columns, use_pandas_metadata=True))
+    df = from_storage(df)
+    return df.sort_values(TS_COLUMN, kind="stable").tail(n).reset_index(drop=True)
+
+def read_table(path, columns=None, start=None, end=None):
+    # Чтение с фильтром по ts; значения фильтра под формат файла
+    compact = is_compact(path)
+    convert = ts_to_ms if compact else (lambda v: pd.Timestamp(v))
+    filters = []
+    if start is not None:
+        filters.append((TS_COLUMN, ">=", convert(start)))
+    if end is not None:
+        filters.append((TS_COLUMN, "<=", convert(end)))
+    if columns is not None and TS_COLUMN not in columns:
+        columns = [TS_COLUMN] + list(columns)
+    df = _frame(pq.read_table(path, columns=columns, filters=filters or None))
+    return from_storage(df)
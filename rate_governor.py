@@ -0,0 +1,100 @@
+import os
+import json
+import time
+import hashlib
+
+from file_lock import lock, unlock
+
+# === Общий лимит запросов на API-ключ для всех процессов ===
+# Все процессы одного ключа (запись позиций и торговля каждого бота) берут токены
+# из одного ведра. Состояние ведра лежит в файле <GOVERNOR_DIR>/<hash ключа>.bucket
+# и меняется только под файловой блокировкой.
+# Приоритеты: ордера и отмены могут выбрать ведро до дна, опрос состояния — только
+# до резерва. Пока ордер ждёт токен, опрос уступает ему очередь.
+# Ответ биржи «лимит превышен» (backoff) опустошает ведро до сброса лимита.
+
+GOVERNOR_DIR = os.environ.get("BYBIT_GOVERNOR_DIR", os.path.join("run", "ratelimit"))
+KEY_RATE = float(os.environ.get("BYBIT_KEY_RATE", 10))    # токенов в секунду
+KEY_BURST = float(os.environ.get("BYBIT_KEY_BURST", 20))  # ёмкость ведра
+
+PRIORITY_ORDERS = 0
+PRIORITY_QUERIES = 1
+# Доля ёмкости, которую класс не может занять
+RESERVE = {
+    PRIORITY_ORDERS: 0.0,
+    PRIORITY_QUERIES: 0.3,
+}
+MAX_SLEEP = 0.25
+
+
+class RateGovernor:
+    def __init__(self, api_key, rate=KEY_RATE, burst=KEY_BURST):
+        os.makedirs(GOVERNOR_DIR, exist_ok=True)
+        key_id = hashlib.sha256(api_key.encode()).hexdigest()[:16]
+        self.path = os.path.join(GOVERNOR_DIR, f"{key_id}.bucket")
+        self.rate = rate
+        self.burst = burst
+
+    def _take(self, priority):
+        # Одна попытка взять токен под блокировкой. Возвращает 0 или сколько ждать.
+        with open(self.path, "a+") as f:
+            lock(f)
+            try:
+                f.seek(0)
+                raw = f.read()
+                state = json.loads(raw) if raw else {}
+                now = time.time()
+                tokens = state.get("tokens", self.burst)
+                updated = state.get("updated", now)
+                orders_waiting_until = state.get("orders_waiting_until", 0)
+                tokens = min(self.burst, tokens + (now - updated) * self.rate)
+
+                floor = self.burst * RESERVE[priority]
+                yield_to_orders = priority > PRIORITY_ORDERS and orders_waiting_until > now
+                if tokens - 1 >= floor and not yield_to_orders:
+                    tokens -= 1
+                    wait = 0.0
+                else:
+                    wait = max((floor + 1 - tokens) / self.rate, 0.01)
+                    if priority == PRIORITY_ORDERS:
+                        orders_waiting_until = now + wait
+
+                f.seek(0)
+                f.truncate()
+                f.write(json.dumps({
+                    "tokens": tokens,
+                    "updated": now,
+                    "orders_waiting_until": orders_waiting_until,
+                }))
+                f.flush()
+                return wait
+            finally:
+                unlock(f)
+
+    def backoff(self, seconds):
+        # Биржа ответила превышением лимита (10006): ведро пустеет и не
+        # наполняется seconds секунд — ждут все процессы ключа
+        with open(self.path, "a+") as f:
+            lock(f)
+            try:
+                f.seek(0)
+                raw = f.read()
+                state = json.loads(raw) if raw else {}
+                now = time.time()
+                state["tokens"] = 0.0
+                state["updated"] = max(state.get("updated", now), now + seconds)
+                f.seek(0)
+                f.truncate()
+                f.write(json.dumps(state))
+                f.flush()
+            finally:
+                unlock(f)
+
+    def acquire(self, priority=PRIORITY_QUERIES):
+        # Блокирует до получения токена, возвращает время ожидания в секундах
+        started = time.monotonic()
+        while True:
+            wait = self._take(priority)
+            if wait == 0:
+                return time.monotonic() - started
+            time.sleep(min(wait, MAX_SLEEP))
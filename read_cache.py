@@ -0,0 +1,31 @@
+import os
+
+# === Кэш разобранных файлов, которые опрашиваются каждую минуту ===
+# Ключ версии — устройство, inode, mtime (нс) и размер файла (или номер,
+# который публикует писатель, например seq из commit_events). Пока версия та же,
+# возвращается уже разобранный объект без чтения и разбора файла.
+# Все писатели подменяют файлы атомарно (временный файл + os.replace), так что
+# новая запись — это новый inode, а недописанный файл версией не становится.
+# Возвращаемый объект общий для всех вызовов — менять его нельзя.
+# Ключ кэша — путь: на файл одна запись (версия, decode, значение), так что
+# кэш не растёт, даже если decode — новая лямбда на каждый вызов (тогда она
+# просто всегда читает файл заново).
+
+_entries = {}
+
+
+def file_version(path):
+    stat = os.stat(path)
+    return stat.st_dev, stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+def cached_read(path, decode, version=None):
+    # decode(path) — только если файл изменился с прошлого чтения этим же decode
+    version = file_version(path) if version is None else version
+    entry = _entries.get(path)
+    if entry is not None and entry[0] == version and entry[1] is decode:
+        return entry[2]
+    # Версия снята до чтения: если файл поменяется во время разбора,
+    # следующий вызов увидит новую версию и прочитает заново
+    value = decode(path)
+    _entries[path] = (version, decode, value)
+    return value
@@ -5,6 +5,7 @@ import time
 import json
 import signal
 import psutil
+from bybit_client import settings_env
 
 ACCOUNTS_FILE = "accounts.json"
 LOG_DIR = "logs"
@@ -38,12 +39,47 @@ try:
 except Exception as e:
     print(f"⚠️ Не удалось запустить memory_watcher.py: {e}")
 
-# === Старт глобальных скриптов по каждому bot_name ===
+# === Общий сборщик свечей ===
+# Один процесс collector.py собирает свечи всех символов из accounts.json
+# в общее хранилище strategy_data/market/<category>/<symbol>. Без него свечи
+# не пишутся ни для одного символа — поэтому перезапускаем его в основном
+# цикле, как и скрипты ботов (не чаще RESTART_DELAY).
+COLLECTOR_MODE = os.environ.get("COLLECTOR_MODE", "rest")
+COLLECTOR_KEY = "global:collector"
+
+def supervise_collector(now):
+    if COLLECTOR_KEY in processes:
+        exit_code = processes[COLLECTOR_KEY].poll()
+        if exit_code is None:
+            return
+        print(f"⚠️ Процесс {COLLECTOR_KEY} завершился с кодом {exit_code}")
+        if now - restart_timestamps.get(COLLECTOR_KEY, 0) <= RESTART_DELAY:
+            print(f"⏳ Пропущен перезапуск {COLLECTOR_KEY} (ждём {RESTART_DELAY} сек)")
+            return
+    restart_timestamps[COLLECTOR_KEY] = now
+    collector_log = open(os.path.join(LOG_DIR, "collector.py.log"), "a", encoding="utf-8")
+    collector_log.write(f"\n=== Запуск collector.py ({COLLECTOR_MODE}) в {time.strftime('%Y-%m-%d %H:%M:%S')} ===\n")
+    collector_log.flush()
+    collector_env = os.environ.copy()
+    if accounts:
+        collector_env.update(settings_env(accounts[0].get("http", {})))
+    processes[COLLECTOR_KEY] = subprocess.Popen(
+        [sys.executable, "collector.py", "--mode", COLLECTOR_MODE],
+        stdout=collector_log,
+        stderr=collector_log,
+        env=collector_env
+    )
+    own_pids.add(processes[COLLECTOR_KEY].pid)
+    print(f"🚀 Запуск общего сборщика свечей collector.py ({COLLECTOR_MODE})")
+
+supervise_collector(time.time())
+
+# === Старт подготовки признаков по каждому bot_name ===
 launched_global = set()
 
 for acc in accounts:
     for bot_name in acc.get("bots", {}):
-        for global_script in ["1 Формирование базы.py", "2 Подготовка данных к тесту.py"]:
+        for global_script in ["2 Подготовка данных к тесту.py"]:
             key = f"global:{bot_name}:{global_script}"
             script_path = os.path.join("bots", bot_name, global_script)
             log_path = os.path.join(LOG_DIR, f"{bot_name}_{global_script.replace(' ', '_')}.log")
@@ -57,10 +93,13 @@ for acc in accounts:
                 log_file = open(log_path, "a", encoding="utf-8")
                 log_file.write(f"\n=== Запуск {global_script} ({bot_name}) в {time.strftime('%Y-%m-%d %H:%M:%S')} ===\n")
                 log_file.flush()
+                env = os.environ.copy()
+                env.update(settings_env(acc.get("http", {})))
                 proc = subprocess.Popen(
                     [sys.executable, script_path],
                     stdout=log_file,
-                    stderr=log_file
+                    stderr=log_file,
+                    env=env
                 )
                 processes[key] = proc
                 own_pids.add(proc.pid)
@@ -69,6 +108,7 @@ i = 0
 
 while True:
     now = time.time()
+    supervise_collector(now)
 
     for acc in accounts:
         name = acc["name"]
@@ -115,6 +155,7 @@ while True:
                     env["ACCOUNT_PATH"] = account_path
                     env["BOT_NAME"] = bot_name
                     env["BOT_PARAMS"] = json.dumps(params)
+                    env.update(settings_env(acc.get("http", {})))
 
                     script_path = os.path.join("bots", bot_name, script_name)
 
@@ -129,9 +170,8 @@ while True:
 
     # 🔁 Проверка глобальных снова (на случай падений)
     for key, proc in list(processes.items()):
-        if key.startswith("global:") and proc.poll() is not None:
-            bot_name, script_name = key.split(":")[1:]
-            print(f"⚠️ Глобальный скрипт {script_name} для {bot_name} завершился")
+        if key.startswith("global:") and key != COLLECTOR_KEY and proc.poll() is not None:
+            print(f"⚠️ Глобальный скрипт {key} завершился")
             del processes[key]  # чтобы на следующей итерации он запустился снова
 
     if i % 3 == 0:
@@ -0,0 +1,116 @@
+import os
+import pandas as pd
+
+from candle_store import append_candles, read_candles, read_last_candles, list_partitions
+from parquet_schema import read_table, write_table
+from commit_events import CommitCounter
+
+# === Журнал сегментов поверх дневных партиций (признаки, журнал позиций) ===
+#   <path>/<segment_dir>/<seq>.parquet — каждая запись: один маленький сегмент
+#   <path>/YYYY-MM-DD.parquet          — уплотнённые данные (как в candle_store)
+# Запись — один новый файл, без чтения и перезаписи истории. Раз в
+# compact_every сегментов они сливаются в партиции своих дней (upsert по ts)
+# и удаляются, так что работа на запись не растёт вместе с историей.
+# При чтении более поздний сегмент перекрывает партиции и более ранние сегменты.
+# Каждая запись увеличивает счётчик <path>.seq (рядом с каталогом — он
+# переживает подмену каталога при полной перезаписи); on_commit(df) вызывается
+# до счётчика, так что проснувшийся читатель уже видит всё опубликованное.
+
+SEGMENT_SUFFIX = ".parquet"
+
+
+def journal_commit_path(path):
+    return path.rstrip(os.sep) + ".seq"
+
+def combine_versions(frames):
+    # frames от старых к новым; по каждому ts остаётся последняя версия
+    frames = [f for f in frames if not f.empty]
+    if not frames:
+        return pd.DataFrame(columns=["ts"])
+    df = pd.concat(frames, ignore_index=True)
+    return df.drop_duplicates(subset="ts", keep="last").sort_values("ts").reset_index(drop=True)
+
+
+class SegmentJournal:
+    def __init__(self, path, segment_dir, compact_every, float32=None, on_commit=None):
+        self.path = path
+        self.segment_path = os.path.join(path, segment_dir)
+        self.compact_every = compact_every
+        self.float32 = float32
+        self.on_commit = on_commit
+        self.commits = None
+
+    def publish(self, df):
+        if self.on_commit is not None:
+            self.on_commit(df)
+        if self.commits is None:
+            self.commits = CommitCounter(journal_commit_path(self.path))
+        self.commits.publish(df["ts"].max())
+
+    def list_segments(self):
+        # Список (seq, путь) по возрастанию seq
+        if not os.path.isdir(self.segment_path):
+            return []
+        segments = [
+            (int(name[:-len(SEGMENT_SUFFIX)]), os.path.join(self.segment_path, name))
+            for name in os.listdir(self.segment_path)
+            if name.endswith(SEGMENT_SUFFIX) and name[:-len(SEGMENT_SUFFIX)].isdigit()
+        ]
+        return sorted(segments)
+
+    def has_data(self):
+        return bool(list_partitions(self.path) or self.list_segments())
+
+    def append(self, df):
+        # Новый сегмент со строками df (колонка ts); при накоплении — уплотнение
+        if df.empty:
+            return
+        os.makedirs(self.segment_path, exist_ok=True)
+        segments = self.list_segments()
+        seq = segments[-1][0] + 1 if segments else 1
+        write_table(df.sort_values("ts"), os.path.join(self.segment_path, f"{seq:012d}{SEGMENT_SUFFIX}"),
+                    float32=self.float32)
+        self.publish(df)
+        if len(segments) + 1 >= self.compact_every:
+            self.compact()
+
+    def compact(self):
+        # Сегменты → партиции их дней. Сначала пишем партиции, потом удаляем
+        # сегменты: при сбое между шагами повторный upsert ничего не портит
+        segments = self.list_segments()
+        if not segments:
+            return
+        df = combine_versions([read_table(path) for _, path in segments])
+        append_candles(self.path, df.set_index("ts"), float32=self.float32, log_rewrites=False)
+        for _, path in segments:
+            os.remove(path)
+        print(f"🗜️ {self.path}: {len(segments)} сегментов уплотнено в партиции ({len(df)} строк)")
+
+    def read(self, start=None, end=None):
+        # Вся история (или [start, end]): партиции + сегменты поверх них
+        while True:
+            segments = self.list_segments()
+            try:
+                base = read_candles(self.path, start=start, end=end).reset_index()
+                return combine_versions([base] + [read_table(path, start=start, end=end) for _, path in segments])
+            except FileNotFoundError:
+                # Сегмент удалило уплотнение — его строки уже в партициях, читаем заново
+                continue
+
+    def read_last(self, n=1):
+        # Последние n строк: свежие сегменты с конца, партиции — только если их не хватило
+        while True:
+            segments = self.list_segments()
+            try:
+                frames = []
+                rows = 0
+                for _, path in reversed(segments):
+                    frames.insert(0, read_table(path))
+                    rows += len(frames[0])
+                    if rows >= n:
+                        break
+                if rows < n:
+                    frames.insert(0, read_last_candles(self.path, n).reset_index())
+                return combine_versions(frames).tail(n).reset_index(drop=True)
+            except FileNotFoundError:
+                continue
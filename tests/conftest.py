@@ -0,0 +1,15 @@
+import os
+import sys
+import pytest
+
+# Модули бота лежат в корне репозитория
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_bybit_ws import FakeBybitServer
+
+
+@pytest.fixture
+def fake_ws():
+    server = FakeBybitServer().start()
+    yield server
+    server.stop()
@@ -0,0 +1,146 @@
+import sys
+import json
+import time
+import asyncio
+import threading
+from websockets.asyncio.server import serve
+
+# === Локальный фейковый WebSocket Bybit v5 для потоков kline/tickers/position/order/execution ===
+# Отвечает на auth, subscribe и ping как биржа и рассылает сообщения тем
+# соединениям, которые подписаны на их topic (pybit падает на чужих topic).
+# drop() обрывает соединения без закрытия — pybit переподключается и
+# восстанавливает подписки сам. Адрес сервера — в BYBIT_WS_PUBLIC_URL /
+# BYBIT_WS_PRIVATE_URL или в аргумент url потоков.
+# Запуск вручную: python tests/fake_bybit_ws.py [port]
+
+SUBSCRIBE_DELAY = 0.1
+
+
+class FakeBybitServer:
+    def __init__(self, host="127.0.0.1", port=0):
+        self.host = host
+        self.port = port
+        self.url = None
+        self.topics = {}        # соединение → множество topic
+        self.connections = 0    # сколько раз подключались
+        self.condition = threading.Condition()
+        self.loop = None
+        self.server = None
+        self.thread = None
+
+    def start(self):
+        started = threading.Event()
+        self.thread = threading.Thread(target=self._run, args=(started,), daemon=True)
+        self.thread.start()
+        started.wait()
+        return self
+
+    def _run(self, started):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.server = self.loop.run_until_complete(self._serve())
+        self.port = self.server.sockets[0].getsockname()[1]
+        self.url = f"ws://{self.host}:{self.port}"
+        started.set()
+        self.loop.run_forever()
+
+    async def _serve(self):
+        # serve() создаёт сервер только внутри работающего цикла
+        return await serve(self._handle, self.host, self.port)
+
+    async def _handle(self, ws):
+        with self.condition:
+            self.topics[ws] = set()
+            self.connections += 1
+            self.condition.notify_all()
+        try:
+            async for raw in ws:
+                message = json.loads(raw)
+                op = message.get("op")
+                reply = {"success": True, "ret_msg": "", "conn_id": "fake", "op": op}
+                if op == "auth":
+                    await ws.send(json.dumps(reply))
+                elif op == "subscribe":
+                    # pybit запоминает req_id и колбэки уже после отправки —
+                    # отвечаем с задержкой, как настоящая сеть
+                    await asyncio.sleep(SUBSCRIBE_DELAY)
+                    await ws.send(json.dumps({**reply, "req_id": message.get("req_id", "")}))
+                    with self.condition:
+                        self.topics[ws].update(message.get("args", []))
+                        self.condition.notify_all()
+                elif op == "ping":
+                    await ws.send(json.dumps({**reply, "ret_msg": "pong", "req_id": message.get("req_id", "")}))
+        except Exception:
+            pass
+        finally:
+            with self.condition:
+                self.topics.pop(ws, None)
+                self.condition.notify_all()
+
+    def subscribed(self, topic):
+        with self.condition:
+            return any(topic in topics for topics in self.topics.values())
+
+    def wait_subscribed(self, topics, connections=1, timeout=10):
+        # Ждём, пока подключились connections раз и подписались на все topics
+        with self.condition:
+            return self.condition.wait_for(
+                lambda: self.connections >= connections
+                and all(any(t in s for s in self.topics.values()) for t in topics), timeout)
+
+    def send(self, message):
+        # Сообщение всем подписанным на message["topic"]; число получателей
+        async def broadcast():
+            targets = [ws for ws, topics in list(self.topics.items()) if message["topic"] in topics]
+            for ws in targets:
+                await ws.send(json.dumps(message))
+            return len(targets)
+        return asyncio.run_coroutine_threadsafe(broadcast(), self.loop).result(5)
+
+    def drop(self):
+        # Обрыв TCP без закрывающего кадра — как пропавшая сеть
+        def abort():
+            for ws in list(self.topics):
+                ws.transport.abort()
+        self.loop.call_soon_threadsafe(abort)
+
+    def stop(self):
+        async def close():
+            self.server.close()
+            await self.server.wait_closed()
+        asyncio.run_coroutine_threadsafe(close(), self.loop).result(5)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(5)
+
+
+def kline_message(symbol, start, close, confirm, interval=1):
+    # Сообщение kline.<interval>.<symbol> с одной минутой start (pd.Timestamp)
+    start_ms = int(start.timestamp() * 1000)
+    return {
+        "topic": f"kline.{interval}.{symbol}",
+        "type": "snapshot",
+        "ts": start_ms,
+        "data": [{
+            "start": start_ms, "end": start_ms + 59_999, "interval": str(interval),
+            "open": str(close), "high": str(close), "low": str(close), "close": str(close),
+            "volume": "1", "turnover": str(close), "confirm": confirm, "timestamp": start_ms,
+        }],
+    }
+
+def private_message(topic, items):
+    # position / order / execution
+    return {"topic": topic, "id": f"fake-{time.time_ns()}", "creationTime": int(time.time() * 1000), "data": items}
+
+def ticker_message(symbol, mark_price):
+    return {"topic": f"tickers.{symbol}", "type": "snapshot", "ts": int(time.time() * 1000),
+            "data": {"symbol": symbol, "markPrice": str(mark_price)}}
+
+
+if __name__ == "__main__":
+    server = FakeBybitServer(port=int(sys.argv[1]) if len(sys.argv) > 1 else 8765).start()
+    print(f"🧪 Фейковый WebSocket Bybit: {server.url}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.stop()
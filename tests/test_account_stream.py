@@ -0,0 +1,97 @@
+import time
+import pandas as pd
+
+from account_stream import AccountStream
+from execution_journal import ChangeRecorder, append_execution, read_executions
+from fake_bybit_ws import private_message, ticker_message
+
+SYMBOL = "ETHUSDT"
+HEARTBEAT = 300
+T0 = pd.Timestamp("2024-01-01 00:00", tz="UTC")
+
+
+def _until(predicate, timeout=5):
+    deadline = time.time() + timeout
+    while not predicate():
+        assert time.time() < deadline, "сообщение потока не дошло"
+        time.sleep(0.01)
+
+def _order(order_id, price, qty, status):
+    return {"symbol": SYMBOL, "orderId": order_id, "price": str(price), "qty": str(qty),
+            "orderStatus": status, "stopOrderType": ""}
+
+
+def test_stream_records_only_changes_and_heartbeats(fake_ws, tmp_path):
+    journal = str(tmp_path / "executions")
+    recorder = ChangeRecorder(lambda ts, record: append_execution(journal, {"ts": ts, **record}), HEARTBEAT)
+    stream = AccountStream(SYMBOL, "linear", "key", "secret", private_url=fake_ws.url, public_url=fake_ws.url)
+    stream.start()
+    state = stream.state
+
+    def offer(second):
+        # Секунды теста — и ts записи, и часы heartbeat
+        return recorder.offer(T0 + pd.Timedelta(seconds=second), state.snapshot(), now=second)
+
+    try:
+        assert fake_ws.wait_subscribed(["position", "order", "execution", f"tickers.{SYMBOL}"])
+        state.reset({"size": 0.0, "avg_price": 0.0, "side": ""}, [], 100.0)
+        assert offer(0)
+
+        # Новый ордер — запись
+        fake_ws.send(private_message("order", [_order("a", 99.0, 1.0, "New")]))
+        _until(lambda: state.snapshot()["order_count"] == 1)
+        assert offer(1)
+
+        # Только mark price — не изменение
+        fake_ws.send(ticker_message(SYMBOL, 101.0))
+        _until(lambda: state.snapshot()["mark_price"] == 101.0)
+        assert not offer(2)
+
+        # Исполнение само по себе позицию не меняет
+        fake_ws.send(private_message("execution", [{"symbol": SYMBOL, "orderId": "a", "execQty": "1"}]))
+        _until(lambda: state.fills == 1)
+        assert not offer(3)
+
+        # Ордер исполнен, позиция открыта — запись
+        fake_ws.send(private_message("order", [_order("a", 99.0, 1.0, "Filled")]))
+        fake_ws.send(private_message("position", [{"symbol": SYMBOL, "size": "1", "avgPrice": "99",
+                                                   "side": "Buy", "markPrice": "102"}]))
+        _until(lambda: state.snapshot()["position_size"] == 1.0 and state.snapshot()["order_count"] == 0)
+        assert offer(4)
+
+        # Без изменений — ничего до heartbeat, затем одна запись
+        assert not offer(4 + HEARTBEAT - 1)
+        assert offer(4 + HEARTBEAT)
+        assert not offer(5 + HEARTBEAT)
+
+        # Чужой символ состояние не трогает
+        fake_ws.send(private_message("position", [{"symbol": "BTCUSDT", "size": "5", "avgPrice": "1", "side": "Sell"}]))
+        fake_ws.send(ticker_message(SYMBOL, 103.0))
+        _until(lambda: state.snapshot()["mark_price"] == 103.0)
+        assert state.snapshot()["position_size"] == 1.0
+    finally:
+        stream.stop()
+
+    rows = read_executions(journal)
+    assert rows["ts"].tolist() == [T0 + pd.Timedelta(seconds=s) for s in (0, 1, 4, 4 + HEARTBEAT)]
+    assert rows["order_count"].tolist() == [0, 1, 0, 0]
+    assert [list(v) for v in rows["order_prices"]] == [[], [99.0], [], []]
+    assert rows["position_size"].tolist() == [0.0, 0.0, 1.0, 1.0]
+    assert rows["side"].tolist() == ["", "", "Buy", "Buy"]
+    assert rows["mark_price"].tolist() == [100.0, 100.0, 102.0, 102.0]
+
+def test_failed_write_is_retried_on_next_offer():
+    written = []
+    def write(ts, record):
+        if not written:
+            written.append(None)
+            raise OSError("disk full")
+        written.append(ts)
+    recorder = ChangeRecorder(write, HEARTBEAT)
+    record = {"position_size": 0.0, "avg_price": 0.0, "side": "", "order_prices": [], "order_sizes": []}
+    try:
+        recorder.offer(1, record, now=1)
+    except OSError:
+        pass
+    assert recorder.offer(2, record, now=2)
+    assert written == [None, 2]
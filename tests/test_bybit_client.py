@@ -0,0 +1,74 @@
+import time
+import pytest
+import requests
+from pybit.exceptions import InvalidRequestError, FailedRequestError
+
+import rate_governor
+from bybit_client import ExchangeClient
+
+
+def _error(code, reset_in=None):
+    headers = {"X-Bapi-Limit-Reset-Timestamp": str(int((time.time() + reset_in) * 1000))} if reset_in else {}
+    return InvalidRequestError(request="GET /v5/x", message="err", status_code=code, time="", resp_headers=headers)
+
+def _failing(*errors):
+    # Сначала поднимает errors по очереди, потом отвечает
+    calls = []
+    def method(**kwargs):
+        calls.append(kwargs)
+        if len(calls) <= len(errors):
+            raise errors[len(calls) - 1]
+        return {"retCode": 0}
+    return method, calls
+
+class FakeResponse:
+    status_code = 200
+    url = "https://api.bybit.com/v5/order/create"
+    headers = {"X-Bapi-Limit-Reset-Timestamp": "0"}
+
+    def json(self):
+        return {"retCode": 10006, "retMsg": "Too many visits!"}
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(rate_governor, "GOVERNOR_DIR", str(tmp_path))
+    monkeypatch.setattr("bybit_client.RETRY_BASE_DELAY", 0.01)
+    return ExchangeClient(api_key="key", api_secret="secret")
+
+
+def test_pybit_does_not_retry_on_its_own(client, monkeypatch):
+    slept = []
+    monkeypatch.setattr("pybit._http_manager.time.sleep", slept.append)
+    assert client.session.max_retries == 1
+    # 10006 доходит до _call исключением, без сна внутри pybit
+    with pytest.raises(InvalidRequestError) as error:
+        client.session._handle_response(FakeResponse(), "POST", "/v5/order/create", {}, 5000, 0)
+    assert error.value.status_code == 10006
+    assert slept == []
+
+def test_rate_limit_is_retried_through_the_governor(client):
+    method, calls = _failing(_error(10006, reset_in=0.3))
+    started = time.time()
+    assert client._call("place_order", method, (), {"symbol": "BNBUSDT"}) == {"retCode": 0}
+    # Повтор ордера после 10006 безопасен — запрос отклонён; ждём сброса лимита в acquire
+    assert len(calls) == 2
+    assert time.time() - started >= 0.25
+    stat = client.stats["place_order"]
+    assert stat["retries"] == 1 and stat["errors"] == 1 and stat["wait_ms"] >= 250
+
+def test_client_errors_and_non_idempotent_failures_are_not_retried(client):
+    method, calls = _failing(FailedRequestError(request="", message="Bad", status_code=400, time="", resp_headers={}))
+    with pytest.raises(FailedRequestError):
+        client._call("get_positions", method, (), {})
+    assert len(calls) == 1
+
+    method, calls = _failing(requests.exceptions.ReadTimeout())
+    with pytest.raises(requests.exceptions.ReadTimeout):
+        client._call("place_order", method, (), {})
+    assert len(calls) == 1
+
+    method, calls = _failing(_error(10016), FailedRequestError(request="", message="Bad gateway", status_code=502,
+                                                               time="", resp_headers={}))
+    assert client._call("get_positions", method, (), {}) == {"retCode": 0}
+    assert len(calls) == 3
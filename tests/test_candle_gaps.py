@@ -0,0 +1,51 @@
+import pandas as pd
+
+from candle_store import append_candles
+from candle_gaps import (record_candles, record_repair_attempt, load_gap_index, missing_ranges,
+                         is_range_complete, ts_to_minute, MAX_REPAIR_ATTEMPTS)
+
+
+def _ts(value):
+    return pd.Timestamp(value, tz="UTC")
+
+def _write(store, start, periods):
+    idx = pd.date_range(start, periods=periods, freq="min", tz="UTC")
+    df = pd.DataFrame({c: 1.0 for c in ["open", "high", "low", "close", "volume"]}, index=idx)
+    append_candles(store, df)
+    record_candles(store, df.index)
+
+def _mark_empty(store, gap):
+    for _ in range(MAX_REPAIR_ATTEMPTS):
+        record_repair_attempt(store, gap)
+
+
+def test_partially_refilled_empty_range_keeps_the_rest(tmp_path):
+    store = str(tmp_path / "1min")
+    _write(store, "2024-01-01 00:00", 10)
+    _write(store, "2024-01-01 00:20", 10)
+    gap = [ts_to_minute(_ts("2024-01-01 00:10")), ts_to_minute(_ts("2024-01-01 00:19"))]
+    assert load_gap_index(store)["gaps"] == [gap]
+    _mark_empty(store, gap)
+    assert load_gap_index(store)["empty"] == [gap]
+
+    # Биржа всё же отдала две минуты внутри простоя
+    _write(store, "2024-01-01 00:14", 2)
+    index = load_gap_index(store)
+    assert index["gaps"] == []
+    assert index["empty"] == [[gap[0], gap[0] + 3], [gap[0] + 6, gap[1]]]
+    assert is_range_complete(store, _ts("2024-01-01 00:00"), _ts("2024-01-01 00:29"))
+    assert not is_range_complete(store, _ts("2024-01-01 00:00"), _ts("2024-01-01 00:29"), include_empty=True)
+    assert missing_ranges(store, include_empty=True) == [
+        (_ts("2024-01-01 00:10"), _ts("2024-01-01 00:13")),
+        (_ts("2024-01-01 00:16"), _ts("2024-01-01 00:19")),
+    ]
+
+def test_fully_refilled_empty_range_disappears(tmp_path):
+    store = str(tmp_path / "1min")
+    _write(store, "2024-01-01 00:00", 10)
+    _write(store, "2024-01-01 00:20", 10)
+    gap = load_gap_index(store)["gaps"][0]
+    _mark_empty(store, gap)
+    _write(store, "2024-01-01 00:10", 10)
+    assert load_gap_index(store)["empty"] == []
+    assert is_range_complete(store, _ts("2024-01-01 00:00"), _ts("2024-01-01 00:29"), include_empty=True)
@@ -0,0 +1,81 @@
+import os
+import json
+import pandas as pd
+import pyarrow.parquet as pq
+
+import execution_journal
+from execution_journal import (append_execution, read_executions, read_last_execution, list_segments,
+                               upgrade_executions, explode_orders, executions_asof, LADDER_COLUMNS)
+from candle_store import list_partitions
+from segment_journal import SegmentJournal, combine_versions
+
+T0 = pd.Timestamp("2024-01-01 00:00", tz="UTC")
+
+
+def _record(i, prices):
+    return {"ts": T0 + pd.Timedelta(minutes=i), "position_size": float(i), "avg_price": 600.0 + i,
+            "side": "Buy", "mark_price": 601.0, "position_open": True, "order_count": len(prices),
+            "order_prices": prices, "order_sizes": [1.0] * len(prices)}
+
+
+def test_round_trip_and_last_row(tmp_path):
+    journal = str(tmp_path / "executions")
+    for i in range(3):
+        append_execution(journal, _record(i, [590.0 - i, 580.0]))
+    df = read_executions(journal)
+    assert df["ts"].tolist() == [T0 + pd.Timedelta(minutes=i) for i in range(3)]
+    assert [list(v) for v in df["order_prices"]] == [[590.0, 580.0], [589.0, 580.0], [588.0, 580.0]]
+    # Без float32: цены позиций не теряют знаки
+    assert df["avg_price"].dtype == "float64"
+    last = read_last_execution(journal)
+    assert last["ts"] == T0 + pd.Timedelta(minutes=2) and last["position_size"] == 2.0
+    orders = explode_orders(df)
+    assert len(orders) == 6 and orders["price"].tolist()[:2] == [590.0, 580.0]
+
+def test_compaction_at_compact_every(tmp_path, monkeypatch):
+    monkeypatch.setattr(execution_journal, "COMPACT_EVERY", 4)
+    journal = str(tmp_path / "executions")
+    for i in range(3):
+        append_execution(journal, _record(i, [590.0]))
+    assert len(list_segments(journal)) == 3 and not list_partitions(journal)
+
+    append_execution(journal, _record(3, [590.0]))
+    assert list_segments(journal) == []
+    assert len(list_partitions(journal)) == 1
+    append_execution(journal, _record(4, [591.0]))
+    df = read_executions(journal)
+    assert df["position_size"].tolist() == [0.0, 1.0, 2.0, 3.0, 4.0]
+    assert read_last_execution(journal)["order_prices"].tolist() == [591.0]
+    # Окно чтения и as-of по уплотнённым партициям и сегменту поверх них
+    assert read_executions(journal, start=T0 + pd.Timedelta(minutes=3))["position_size"].tolist() == [3.0, 4.0]
+    asof = executions_asof(journal, [T0 + pd.Timedelta(minutes=3, seconds=30)])
+    assert asof["position_size"].tolist() == [3.0]
+
+def test_later_segment_overrides_partitions(tmp_path):
+    journal = SegmentJournal(str(tmp_path / "j"), "segments", compact_every=100, float32=False)
+    journal.append(pd.DataFrame({"ts": [T0, T0 + pd.Timedelta(minutes=1)], "v": [1.0, 2.0]}))
+    journal.compact()
+    journal.append(pd.DataFrame({"ts": [T0 + pd.Timedelta(minutes=1)], "v": [3.0]}))
+    assert journal.read()["v"].tolist() == [1.0, 3.0]
+    assert journal.read_last(1)["v"].tolist() == [3.0]
+    assert combine_versions([]).empty
+
+def test_upgrade_json_string_ladders(tmp_path):
+    journal = str(tmp_path / "executions")
+    append_execution(journal, _record(0, [590.0, 580.0]))
+    # Сегмент старого формата: лестница строками json
+    old = pd.DataFrame([{**_record(1, []), "order_prices": json.dumps([589.0]), "order_sizes": json.dumps([2.0])}])
+    old_path = str(tmp_path / "executions" / "segments" / "000000000002.parquet")
+    old.to_parquet(old_path, index=False)
+
+    upgrade_executions(journal)
+    schema = pq.read_schema(old_path)
+    for column in LADDER_COLUMNS:
+        assert str(schema.field(column).type) == "list<element: double>"
+    df = read_executions(journal)
+    assert [list(v) for v in df["order_prices"]] == [[590.0, 580.0], [589.0]]
+    assert [list(v) for v in df["order_sizes"]] == [[1.0, 1.0], [2.0]]
+    # Повторный запуск ничего не переписывает
+    before = os.stat(old_path).st_mtime_ns
+    upgrade_executions(journal)
+    assert os.stat(old_path).st_mtime_ns == before
@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+
+import indicator_engine
+from candle_store import append_candles, read_candles
+from indicator_engine import TimeframeIndicators, compute_indicators
+
+SPECS = [{"name": "rsi_5", "indicator": "rsi", "window": 5, "timeframe": "1min"},
+         {"name": "ema_10", "indicator": "ema", "window": 10, "timeframe": "1min"}]
+
+
+def _candles(start, periods, seed=1):
+    idx = pd.date_range(start, periods=periods, freq="min", tz="UTC", name="ts")
+    close = np.round(100 + np.random.default_rng(seed).standard_normal(periods).cumsum(), 2)
+    return pd.DataFrame({"open": close, "high": close + 0.5, "low": close - 0.5, "close": close, "volume": 1.0},
+                        index=idx)
+
+
+def test_steady_updates_do_not_reread_the_first_partition(tmp_path, monkeypatch):
+    store = str(tmp_path / "1min")
+    history = _candles("2024-01-02 00:00", 600)
+    append_candles(store, history.iloc[:300])
+    calls = []
+    first_candle_ts = indicator_engine.first_candle_ts
+    monkeypatch.setattr(indicator_engine, "first_candle_ts", lambda path: calls.append(path) or first_candle_ts(path))
+
+    engine = TimeframeIndicators(store, SPECS, str(tmp_path / "state"))
+    engine.update()
+    for i in range(300, 320):
+        append_candles(store, history.iloc[i:i + 1])
+        engine.update()
+    assert len(calls) <= 1
+
+    # Догрузка начала истории — переписывание: первый бар перечитан, пересчёт с начала
+    older = _candles("2024-01-01 23:00", 60, seed=2)
+    append_candles(store, older)
+    append_candles(store, history.iloc[320:321])
+    values = engine.update()
+    assert engine.first_ts == older.index[0]
+    assert len(calls) == 2
+
+    expected = compute_indicators(read_candles(store), SPECS)
+    for name in ("rsi_5", "ema_10"):
+        np.testing.assert_array_equal(values[name].to_numpy(), expected[name].iloc[-len(values):].to_numpy())
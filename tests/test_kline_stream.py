@@ -0,0 +1,71 @@
+import pandas as pd
+
+from candle_collector import SymbolCollector
+from candle_store import read_candles
+from candle_gaps import load_gap_index
+from kline_stream import KlineStream
+from fake_bybit_ws import kline_message
+
+SYMBOL = "ETHUSDT"
+T0 = pd.Timestamp("2024-01-01 00:00", tz="UTC")
+
+
+def _minute(i):
+    return T0 + pd.Timedelta(minutes=i)
+
+def _bars(minutes, close):
+    idx = pd.DatetimeIndex([_minute(i) for i in minutes], name="ts")
+    return pd.DataFrame({"open": close, "high": close, "low": close, "close": close, "volume": 1.0}, index=idx)
+
+def _pump(stream, collector, until):
+    # Свечи из потока в сборщик, как в collector.run_stream
+    while not until():
+        item = stream.get(timeout=5)
+        assert item is not None, "поток замолчал"
+        symbol, bars = item
+        assert symbol == SYMBOL
+        collector.on_bars(bars)
+
+
+def test_only_confirmed_bars_are_written_and_reconnect_gap_goes_to_rest(fake_ws, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    collector = SymbolCollector(SYMBOL, "linear")
+    collector._write(_bars(range(0, 10), 100.0))
+    collector.last_time = _minute(9)
+
+    # REST отдаёт минуты, пропущенные потоком за время обрыва
+    rest = _bars(range(12, 16), 200.0)
+    requests = []
+    def fetch_new_candles(start_time=None, limit=1000, end_time=None):
+        requests.append(pd.Timestamp(start_time))
+        return rest[rest.index >= start_time].head(limit)
+    monkeypatch.setattr(collector, "fetch_new_candles", fetch_new_candles)
+    monkeypatch.setattr("candle_collector.time.sleep", lambda seconds: None)
+
+    stream = KlineStream([SYMBOL], "linear", url=fake_ws.url)
+    stream.start()
+    try:
+        assert fake_ws.wait_subscribed([f"kline.1.{SYMBOL}"])
+        fake_ws.send(kline_message(SYMBOL, _minute(10), 110.0, confirm=True))
+        fake_ws.send(kline_message(SYMBOL, _minute(11), 999.0, confirm=False))
+        fake_ws.send(kline_message(SYMBOL, _minute(11), 111.0, confirm=True))
+        fake_ws.send(kline_message(SYMBOL, _minute(12), 999.0, confirm=False))
+        _pump(stream, collector, lambda: collector.last_time == _minute(11))
+
+        # Обрыв: pybit переподключается и подписывается заново, минуты 12-15 потеряны
+        fake_ws.drop()
+        assert fake_ws.wait_subscribed([f"kline.1.{SYMBOL}"], connections=2)
+        fake_ws.send(kline_message(SYMBOL, _minute(16), 116.0, confirm=True))
+        fake_ws.send(kline_message(SYMBOL, _minute(17), 999.0, confirm=False))
+        _pump(stream, collector, lambda: collector.last_time == _minute(16))
+    finally:
+        stream.stop()
+
+    candles = read_candles(collector.store_1min)
+    assert list(candles.index) == [_minute(i) for i in range(0, 17)]
+    assert candles.loc[_minute(10):_minute(11), "close"].tolist() == [110.0, 111.0]
+    assert candles.loc[_minute(12):_minute(15), "close"].tolist() == [200.0] * 4
+    assert candles.loc[_minute(16), "close"] == 116.0
+    assert (candles["close"] != 999.0).all()
+    assert requests[0] == _minute(12)
+    assert load_gap_index(collector.store_1min)["gaps"] == []
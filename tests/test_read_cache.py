@@ -0,0 +1,38 @@
+import os
+
+import read_cache
+from read_cache import cached_read
+
+
+def _write(path, text):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+def _read(path):
+    with open(path) as f:
+        return f.read()
+
+
+def test_cached_until_the_file_changes(tmp_path):
+    path = str(tmp_path / "state.json")
+    _write(path, "1")
+    reads = []
+    def decode(p):
+        reads.append(p)
+        return _read(p)
+    assert cached_read(path, decode) == "1"
+    assert cached_read(path, decode) == "1"
+    assert len(reads) == 1
+    _write(path, "22")
+    assert cached_read(path, decode) == "22"
+    assert len(reads) == 2
+
+def test_new_decoder_per_call_does_not_grow_the_cache(tmp_path):
+    path = str(tmp_path / "state.json")
+    _write(path, "1")
+    before = len(read_cache._entries)
+    for _ in range(100):
+        assert cached_read(path, lambda p: _read(p)) == "1"
+    assert len(read_cache._entries) == before + 1
@@ -0,0 +1,30 @@
+import pandas as pd
+
+from parquet_schema import ts_to_ms
+
+# === Привязка старших таймфреймов к строкам базового по закрытию баров ===
+# Бар с ts (время открытия) таймфрейма tf закрывается в ts + tf. Строка
+# базового таймфрейма видит последний бар старшего, закрывшийся не позже её
+# собственного закрытия — как merge_asof(direction="backward") по времени
+# закрытия, за один линейный проход по двум отсортированным рядам.
+# Незакрытые бары сюда не передаются (см. completed_bars), поэтому значения
+# формирующегося бара старшего таймфрейма в строки не попадают — ни в бэктесте,
+# ни вживую.
+
+
+def timeframe_ms(timeframe):
+    return int(pd.Timedelta(timeframe).total_seconds() * 1000)
+
+def completed_bars(frame):
+    # Последний бар хранилища ещё формируется — его не показываем
+    return frame.iloc[:-1]
+
+def align_closed(base_ts, base_timeframe, frame, timeframe):
+    # base_ts — время открытия строк базового таймфрейма (по возрастанию);
+    # frame — закрытые бары старшего таймфрейма с индексом ts.
+    # Возвращает колонки frame, выровненные по строкам base_ts
+    left = pd.DataFrame({"close_ms": ts_to_ms(base_ts) + timeframe_ms(base_timeframe)})
+    right = frame.reset_index(drop=True)
+    right.insert(0, "close_ms", ts_to_ms(frame.index) + timeframe_ms(timeframe))
+    merged = pd.merge_asof(left, right, on="close_ms", direction="backward")
+    return merged.drop(columns="close_ms")
@@ -1,20 +1,45 @@
+import os
+import json
 import pandas as pd
 import numpy as np
 import random
 from itertools import product
 from tqdm import tqdm
 
-# === Пути ===
-FEATURES_PARQUET = "strategy_data/bnb_grid/features.parquet"
-
-# === Загрузка готовых признаков ===
-df_combined = pd.read_parquet(FEATURES_PARQUET)
-df_combined.index = pd.to_datetime(df_combined.index, utc=True)
-df_combined.sort_index(inplace=True)
-df_combined.dropna(inplace=True)
+from feature_spec import load_feature_spec
+from indicator_cube import IndicatorCube
+
+# === Конфигурация стратегии ===
+BOT_NAME = "bnb_grid"
+with open(os.path.join("configs", f"{BOT_NAME}.json")) as f:
+    config = json.load(f)
+SYMBOL = config.get("symbol", "BTCUSDT").upper()
+CATEGORY = config.get("category", "linear")
+FEATURE_SPEC = load_feature_spec(config)
+
+# === Куб индикаторов: колонки для всех перебираемых окон считаются один раз
+# на версию свечей и открываются через mmap; выравнивание по закрытым барам —
+# то же, что у подготовки признаков вживую
+rsi5_window_range = [10, 14, 20]
+rsi30_window_range = [20, 30, 40]
+cci_window_range = [14, 20, 30]
+
+cube = IndicatorCube(SYMBOL, CATEGORY, FEATURE_SPEC)
+cube.prepare({"rsi_5": rsi5_window_range, "rsi_30": rsi30_window_range, "cci_1h": cci_window_range})
+timestamps = cube.ts
+closes = cube.close
 
 # === Бэктест функции ===
-def backtest(df_combined, rsi5_thr, rsi30_thr, cci_thr, grid_size, grid_dist, profit_target, offset):
+def backtest(windows, rsi5_thr, rsi30_thr, cci_thr, grid_size, grid_dist, profit_target, offset):
+    # Колонки выбранных окон из куба — без пересчёта индикаторов
+    rsi5_window, rsi30_window, cci_window = windows
+    rsi5_values = cube.column("rsi_5", rsi5_window)
+    rsi30_values = cube.column("rsi_30", rsi30_window)
+    cci_values = cube.column("cci_1h", cci_window)
+    # Строки до прогрева всех трёх индикаторов пропускаем (как dropna раньше)
+    valid = ~(np.isnan(rsi5_values) | np.isnan(rsi30_values) | np.isnan(cci_values))
+    first = int(valid.argmax()) if valid.any() else len(valid)
+
     initial_cash = 10000
     max_grid_capital = 10000
 
@@ -27,12 +52,8 @@ def backtest(df_combined, rsi5_thr, rsi30_thr, cci_thr, grid_size, grid_dist, pr
     last_entry_price = None
     profit_history = []
 
-    for current_time, row in df_combined.iterrows():
-        price = row['close']
-        rsi5 = row['rsi_5']
-        rsi30 = row['rsi_30']
-        cci = row['cci_1h']
-
+    for current_time, price, rsi5, rsi30, cci in zip(timestamps[first:], closes[first:], rsi5_values[first:],
+                                                     rsi30_values[first:], cci_values[first:]):
         if not entry_triggered and rsi5 < rsi5_thr and rsi30 < rsi30_thr and cci < cci_thr:
             base_price = price * (1 - offset)
             orders = []
@@ -99,12 +120,15 @@ def backtest(df_combined, rsi5_thr, rsi30_thr, cci_thr, grid_size, grid_dist, pr
     if position > 0:
         total_size = sum(s for _, s in entry_prices)
         avg_price = sum(p * s for p, s in entry_prices) / total_size
-        final_price = df_combined['close'].iloc[-1]
+        final_price = closes[-1]
         cash += final_price * position
         profit = final_price * position - sum(p * s for p, s in entry_prices)
         profit_history.append(profit)
 
     return {
+        "RSI5_WINDOW": rsi5_window,
+        "RSI30_WINDOW": rsi30_window,
+        "CCI_WINDOW": cci_window,
         "RSI5": rsi5_thr,
         "RSI30": rsi30_thr,
         "CCI": cci_thr,
@@ -129,6 +153,7 @@ offset_range = [0.0001, 0.0005, 0.001]
 
 # === Формирование всех возможных комбинаций
 all_combinations = list(product(
+    product(rsi5_window_range, rsi30_window_range, cci_window_range),
     rsi5_range,
     rsi30_range,
     cci_range,
@@ -148,7 +173,7 @@ best_profit_result = None
 results = []
 
 for params in tqdm(sampled_params):
-    result = backtest(df_combined, *params)
+    result = backtest(*params)
     results.append(result)
 
     if best_profit_result is None or result["ProfitNet"] > best_profit_result["ProfitNet"]: